@@ -1,10 +1,14 @@
 import os
 import sys
+import asyncio
 import logging
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import Annotated
-from fastapi import FastAPI, HTTPException
+from typing import Annotated, Any, Awaitable, Literal, Optional
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
 
 # Configure logging
@@ -21,8 +25,17 @@ if current_dir not in sys.path:
     sys.path.insert(0, current_dir)
 
 from services.llm_service import LLMService
+from services.config import DISCONNECT_POLL_SECONDS
+from services.result_encoding import RECORDS, apply_result_format, compress, encode_json
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    await llm_service.start()
+    yield
+    # Release pooled HTTP and database connections on shutdown
+    await llm_service.close()
+
+app = FastAPI(lifespan=lifespan)
 
 # Enable CORS
 app.add_middleware(
@@ -33,14 +46,36 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Row layout of SELECT results: "records" (objects), "compact" (row arrays) or "columnar" (column arrays)
+ResultFormat = Literal["records", "compact", "columnar"]
+
 class ChatMessage(BaseModel):
     message: str
+    session_id: Optional[str] = None
+    result_format: ResultFormat = RECORDS
+
+class PageRequest(BaseModel):
+    page_token: str
+    result_format: ResultFormat = RECORDS
 
 # Initialize LLM service
 llm_service = LLMService()
 
+@app.get("/api/stats")
+async def stats_endpoint():
+    """Cache and session counters for monitoring."""
+    return llm_service.get_stats()
+
+@app.get("/api/health")
+async def health_endpoint():
+    """Whether the LLM backend can take requests."""
+    healthy = await llm_service.llm_backend.health()
+    return JSONResponse(status_code=200 if healthy else 503, content={"llm_backend": healthy})
+
 @app.post("/api/chat")
-async def chat_endpoint(message: Annotated[ChatMessage, "Chat message"]):
+async def chat_endpoint(message: Annotated[ChatMessage, "Chat message"], request: Request):
+    # Look up (or start) this client's conversation
+    conversation = llm_service.conversations.get_or_create(message.session_id)
     try:
         # Log incoming request
         logger.info(f" Received new query: {message.message}")
@@ -49,30 +84,41 @@ async def chat_endpoint(message: Annotated[ChatMessage, "Chat message"]):
         start_time = datetime.now()
 
         # Check if it's input for a pending INSERT query
-        is_insert_input = llm_service.is_insert_value_input(message.message)
+        is_insert_input = llm_service.is_insert_value_input(message.message, conversation)
         if is_insert_input:
             logger.info(f" Query type: INSERT field input")
-            response_data = llm_service.process_insert_value_input(message.message)
+            response_data = await _unless_disconnected(
+                request, llm_service.process_insert_value_input(message.message, conversation))
+            if response_data is None:
+                return Response(status_code=499)
 
             # Calculate processing time
             processing_time = (datetime.now() - start_time).total_seconds()
             logger.info(f" INSERT field input processed in {processing_time:.2f} seconds")
 
-            return response_data
+            return _json_response(request, {**response_data, "session_id": conversation.session_id},
+                                  message.result_format)
 
         # Check if it's a follow-up question
-        is_follow_up = llm_service.is_follow_up_question(message.message)
+        is_follow_up = llm_service.is_follow_up_question(message.message, conversation)
         logger.info(f"{'🔄' if is_follow_up else '🆕'} Query type: {'Follow-up' if is_follow_up else 'New query'}")
 
         # Generate response using LLM (now returns JSON)
-        response_data = llm_service.generate_response(message.message)
+        response_data = await _unless_disconnected(request, llm_service.generate_response(message.message, conversation))
+        if response_data is None:
+            return Response(status_code=499)
 
         # Log completion
         processing_time = (datetime.now() - start_time).total_seconds()
         logger.info(f" Query processed in {processing_time:.2f} seconds")
 
-        # Return the JSON response directly
-        return response_data
+        # Generation queue full: tell the client to back off and retry
+        if response_data.get("status") == "overloaded":
+            return _overloaded_response({**response_data, "session_id": conversation.session_id})
+
+        # Return the JSON response directly, tagged with the session id the client should send back
+        return _json_response(request, {**response_data, "session_id": conversation.session_id},
+                              message.result_format)
     except Exception as e:
         logger.error(f"❌ Error processing query: {str(e)}")
         return {
@@ -80,5 +126,74 @@ async def chat_endpoint(message: Annotated[ChatMessage, "Chat message"]):
             "error": str(e),
             "sql_query": "",
             "explanation": "",
-            "data": None
+            "data": None,
+            "session_id": conversation.session_id
         }
+
+@app.post("/api/chat/page")
+async def chat_page_endpoint(page: Annotated[PageRequest, "Page request"], request: Request):
+    """Next page of a SELECT result, from the next_page_token of the previous page."""
+    return _json_response(request, await llm_service.fetch_page(page.page_token), page.result_format)
+
+async def _unless_disconnected(request: Request, work: Awaitable[Any]) -> Optional[Any]:
+    """Await work, cancelling it (and any database query it is running) if the client disconnects first."""
+    task = asyncio.ensure_future(work)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                logger.info(" Client disconnected, cancelling its request")
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                return None
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+
+def _json_response(request: Request, content: dict, result_format: str = RECORDS) -> Response:
+    """JSON response with rows in the requested layout, compressed if the client accepts it."""
+    body, encoding = compress(encode_json(apply_result_format(content, result_format)),
+                              request.headers.get("accept-encoding", ""))
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def _overloaded_response(content: dict) -> JSONResponse:
+    """503 response for requests turned away by the generation admission queue."""
+    return JSONResponse(status_code=503, content=jsonable_encoder(content), headers={"Retry-After": "5"})
+
+def _ndjson_line(event: dict) -> bytes:
+    """Encode one stream event as a line of NDJSON."""
+    return encode_json(event) + b"\n"
+
+@app.post("/api/chat/stream")
+async def chat_stream_endpoint(message: Annotated[ChatMessage, "Chat message"]):
+    """Streaming variant of /api/chat that sends NDJSON events as soon as they are available."""
+    conversation = llm_service.conversations.get_or_create(message.session_id)
+    logger.info(f" Received new streaming query: {message.message}")
+
+    # Reject up front while the stream can still carry a status code
+    if llm_service.admission.is_full():
+        return _overloaded_response({
+            "success": False,
+            "status": "overloaded",
+            "error": "Server is busy. Please retry shortly.",
+            "session_id": conversation.session_id
+        })
+
+    async def event_stream():
+        start_time = datetime.now()
+        yield _ndjson_line({"type": "session", "session_id": conversation.session_id})
+        columns = None
+        async for event in llm_service.stream_response(message.message, conversation):
+            if event.get("type") == "columns":
+                columns = event["columns"]
+            yield _ndjson_line(apply_result_format(event, message.result_format, columns))
+
+        processing_time = (datetime.now() - start_time).total_seconds()
+        logger.info(f" Streaming query processed in {processing_time:.2f} seconds")
+
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
@@ -0,0 +1,137 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+from .config import OLLAMA_MAX_PARALLEL, OLLAMA_MAX_QUEUE, OLLAMA_QUEUE_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+class OverloadedError(Exception):
+    """Raised when a request can't be admitted because the generation queue is full."""
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into a single execution.
+
+    The first caller starts the work as its own task; callers arriving while it
+    runs await the same result. The task is shielded, so a leader whose client
+    disconnects doesn't cancel the work for everyone else; it is cancelled
+    once every caller waiting on it has been cancelled, so abandoned work
+    (e.g. a query nobody will read) doesn't keep running.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self._waiters: Dict[asyncio.Future, int] = {}
+        self.coalesced = 0
+
+    def pending(self, key: str) -> Optional[asyncio.Future]:
+        """Return the in-flight call for a key, if any."""
+        return self._calls.get(key)
+
+    async def _wait(self, future: asyncio.Future) -> Any:
+        """Wait for a call, cancelling it if this was the last caller still waiting."""
+        self._waiters[future] = self._waiters.get(future, 0) + 1
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if self._waiters[future] == 1 and not future.done():
+                future.cancel()
+            raise
+        finally:
+            self._waiters[future] -= 1
+            if not self._waiters[future]:
+                del self._waiters[future]
+
+    async def join(self, future: asyncio.Future) -> Any:
+        """Wait for an in-flight call started by someone else."""
+        self.coalesced += 1
+        return await self._wait(future)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run fn for a key, or join the call already running for it.
+
+        Args:
+            key: Identity of the work (e.g. the normalized question)
+            fn: Coroutine function doing the work
+
+        Returns:
+            The result of the (shared) call
+        """
+        pending = self.pending(key)
+        if pending is not None:
+            return await self.join(pending)
+
+        task = asyncio.ensure_future(fn())
+        self._calls[key] = task
+
+        def _done(finished: asyncio.Future) -> None:
+            if self._calls.get(key) is finished:
+                del self._calls[key]
+            # Mark the exception as retrieved when every waiter has gone away
+            if not finished.cancelled():
+                finished.exception()
+
+        task.add_done_callback(_done)
+        return await self._wait(task)
+
+
+class AdmissionController:
+    """
+    Bounds concurrent model generations.
+
+    At most ``max_concurrency`` generations run at once and at most
+    ``max_queue`` requests wait for a slot; requests beyond that, or that wait
+    longer than ``queue_timeout`` seconds, are rejected with OverloadedError.
+    """
+
+    def __init__(self, max_concurrency: int = OLLAMA_MAX_PARALLEL, max_queue: int = OLLAMA_MAX_QUEUE,
+                 queue_timeout: float = OLLAMA_QUEUE_TIMEOUT):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.running = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    def is_full(self) -> bool:
+        """True when every slot is taken and the wait queue is at capacity."""
+        return self._semaphore.locked() and self.waiting >= self.max_queue
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold a generation slot for the duration of the block."""
+        if self.is_full():
+            self.rejected += 1
+            raise OverloadedError(f"Server is busy: {self.running} generations running and "
+                                  f"{self.waiting} queued. Please retry shortly.")
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise OverloadedError(f"Server is busy: no generation slot freed up within {self.queue_timeout:g}s. "
+                                  f"Please retry shortly.")
+        finally:
+            self.waiting -= 1
+
+        self.running += 1
+        try:
+            yield
+        finally:
+            self.running -= 1
+            self._semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return queue occupancy counters."""
+        return {
+            "running": self.running,
+            "waiting": self.waiting,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "rejected": self.rejected
+        }
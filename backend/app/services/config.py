@@ -1,5 +1,6 @@
 import os
 import logging
+import secrets
 from dotenv import load_dotenv
 
 # Load environment variables from .env file if it exists
@@ -19,5 +20,132 @@ from urllib.parse import quote_plus
 
 password = quote_plus(DATABASE_CONFIG['password'])
 DATABASE_URL = f"postgresql://{DATABASE_CONFIG['user']}:{password}@{DATABASE_CONFIG['host']}:{DATABASE_CONFIG['port']}/{DATABASE_CONFIG['database']}"
+
+# Async driver URL used on the request path so queries don't block the event loop
+ASYNC_DATABASE_URL = f"postgresql+asyncpg://{DATABASE_CONFIG['user']}:{password}@{DATABASE_CONFIG['host']}:{DATABASE_CONFIG['port']}/{DATABASE_CONFIG['database']}"
+
+# Optional read replicas (comma-separated postgresql:// URLs): SELECTs are spread over those within
+# REPLICA_MAX_LAG_SECONDS of the primary, everything else stays on the primary
+DATABASE_REPLICA_URLS = [url.strip().replace("postgresql://", "postgresql+asyncpg://", 1)
+                         for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+REPLICA_CHECK_INTERVAL = float(os.getenv("REPLICA_CHECK_INTERVAL", "5"))
+# Connection pools, one per database shared by every service: (pool size, max overflow) per role,
+# then how long a checkout may wait, when connections are recycled, and whether they are pinged first
+DB_POOL_SIZES = {
+    "primary": (int(os.getenv("DB_PRIMARY_POOL_SIZE", "5")), int(os.getenv("DB_PRIMARY_MAX_OVERFLOW", "10"))),
+    "replica": (int(os.getenv("DB_REPLICA_POOL_SIZE", "10")), int(os.getenv("DB_REPLICA_MAX_OVERFLOW", "20"))),
+    # Sync pool for startup introspection and the INSERT handler's lookups
+    "sync": (int(os.getenv("DB_SYNC_POOL_SIZE", "2")), int(os.getenv("DB_SYNC_MAX_OVERFLOW", "3")))
+}
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# Generated statements run as a template with their literals as bind parameters, so repeated query
+# shapes reuse prepared statements (up to DB_STATEMENT_CACHE_SIZE per connection) and their plans
+SQL_PARAMETERIZE_ENABLED = os.getenv("SQL_PARAMETERIZE_ENABLED", "true").lower() == "true"
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "256"))
+QUERY_SHAPES_MAX = int(os.getenv("QUERY_SHAPES_MAX", "500"))  # templates tracked for per-shape stats
+
+# Ollama configuration
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434/api/chat")
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "SqlGenerator")
+# Which LLM backend serves generations: "ollama", or "stub" (canned SQL with synthetic latency, for load tests)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "ollama").lower()
+LLM_STUB_RESPONSES_PATH = os.getenv("LLM_STUB_RESPONSES_PATH", "")  # JSON file: object of question regex -> SQL
+LLM_STUB_TTFT_MS = os.getenv("LLM_STUB_TTFT_MS", "lognormal:300,0.5")
+LLM_STUB_TOKEN_MS = os.getenv("LLM_STUB_TOKEN_MS", "fixed:15")
+LLM_STUB_SEED = int(os.getenv("LLM_STUB_SEED", "0"))
+# Model routing: simple questions go to OLLAMA_SMALL_MODEL (unset disables routing), the rest to the large model
+OLLAMA_SMALL_MODEL = os.getenv("OLLAMA_SMALL_MODEL", "")
+OLLAMA_LARGE_MODEL = os.getenv("OLLAMA_LARGE_MODEL", OLLAMA_MODEL)
+MODEL_ROUTING_THRESHOLD = int(os.getenv("MODEL_ROUTING_THRESHOLD", "3"))
+# Hedged generation: run several candidates at once and keep the first one that passes EXPLAIN (1 disables it)
+HEDGE_CANDIDATES = int(os.getenv("HEDGE_CANDIDATES", "1"))
+HEDGE_TEMPERATURES = [float(t) for t in os.getenv("HEDGE_TEMPERATURES", "0.2,0.5,0.8").split(",") if t.strip()]
+# Comma-separated chat URLs of every model host; requests go to the least busy healthy one
+OLLAMA_URLS = [url.strip() for url in os.getenv("OLLAMA_URLS", OLLAMA_URL).split(",") if url.strip()]
+OLLAMA_EJECT_AFTER_FAILURES = int(os.getenv("OLLAMA_EJECT_AFTER_FAILURES", "3"))
+OLLAMA_EJECT_SECONDS = float(os.getenv("OLLAMA_EJECT_SECONDS", "30"))
+OLLAMA_HEALTH_INTERVAL = float(os.getenv("OLLAMA_HEALTH_INTERVAL", "10"))
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "300"))
+OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "100"))
+# Upper bound on generated tokens; a single SQL statement rarely needs more
+OLLAMA_NUM_PREDICT = int(os.getenv("OLLAMA_NUM_PREDICT", "512"))
+# How long Ollama keeps the model (and its prompt cache) loaded; -1 pins it in memory
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "-1")
+OLLAMA_KEEP_ALIVE = int(OLLAMA_KEEP_ALIVE) if OLLAMA_KEEP_ALIVE.lstrip("-").isdigit() else OLLAMA_KEEP_ALIVE
+# Admission control: concurrent generations, requests allowed to wait, and how long they may wait
+OLLAMA_MAX_PARALLEL = int(os.getenv("OLLAMA_MAX_PARALLEL", "4"))
+OLLAMA_MAX_QUEUE = int(os.getenv("OLLAMA_MAX_QUEUE", "32"))
+OLLAMA_QUEUE_TIMEOUT = float(os.getenv("OLLAMA_QUEUE_TIMEOUT", "30"))
+
+# Rows per chunk on the streaming chat endpoint
+STREAM_ROW_CHUNK_SIZE = int(os.getenv("STREAM_ROW_CHUNK_SIZE", "200"))
+# Row cap per response for generated SELECTs; larger results continue through signed page tokens
+RESULT_PAGE_SIZE = int(os.getenv("RESULT_PAGE_SIZE", "500"))
+# Secret for signing page tokens (a random one means tokens don't survive a restart)
+PAGE_TOKEN_SECRET = os.getenv("PAGE_TOKEN_SECRET") or secrets.token_hex(32)
+PAGE_TOKEN_TTL_SECONDS = float(os.getenv("PAGE_TOKEN_TTL_SECONDS", "3600"))
+# SELECT result cache: entries are dropped on writes to the tables they read, and after the TTL
+# (which bounds staleness from writers outside this service)
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "1000"))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", "60"))
+# How often shared reference data (department names) is reloaded in the background; 0 disables it
+REFERENCE_REFRESH_SECONDS = float(os.getenv("REFERENCE_REFRESH_SECONDS", "300"))
+# After a failed load, queries go without department names for this long before trying again
+REFERENCE_RETRY_SECONDS = float(os.getenv("REFERENCE_RETRY_SECONDS", "30"))
+# Per-statement timeouts by query type (PostgreSQL statement_timeout), and a deadline for a whole query
+# including streaming its rows; queries past the deadline or whose client disconnected are cancelled
+STATEMENT_TIMEOUTS_MS = {
+    "SELECT": int(os.getenv("STATEMENT_TIMEOUT_SELECT_MS", "15000")),
+    "INSERT": int(os.getenv("STATEMENT_TIMEOUT_INSERT_MS", "5000")),
+    "UPDATE": int(os.getenv("STATEMENT_TIMEOUT_UPDATE_MS", "5000")),
+    "DELETE": int(os.getenv("STATEMENT_TIMEOUT_DELETE_MS", "5000")),
+    # Planning generated SELECTs for the cost gate; kept short so the check stays cheap
+    "EXPLAIN": int(os.getenv("STATEMENT_TIMEOUT_EXPLAIN_MS", "1000"))
+}
+QUERY_DEADLINE_SECONDS = float(os.getenv("QUERY_DEADLINE_SECONDS", "30"))
+# Cost gate for generated SELECTs (PostgreSQL planner estimates): "refuse" queries over the limits, or
+# "limit" them to a smaller page when that brings the estimated cost under COST_GATE_MAX_COST
+COST_GATE_ENABLED = os.getenv("COST_GATE_ENABLED", "true").lower() == "true"
+COST_GATE_MAX_COST = float(os.getenv("COST_GATE_MAX_COST", "1000000"))
+COST_GATE_MAX_ROWS = float(os.getenv("COST_GATE_MAX_ROWS", "10000000"))
+COST_GATE_ACTION = os.getenv("COST_GATE_ACTION", "limit")
+# How often /api/chat checks whether its client is still connected
+DISCONNECT_POLL_SECONDS = float(os.getenv("DISCONNECT_POLL_SECONDS", "0.5"))
+# Rows fetched per round trip from the server-side cursor when building a JSON response
+DB_FETCH_BATCH_SIZE = int(os.getenv("DB_FETCH_BATCH_SIZE", "1000"))
+# JSON responses at least this large are gzip- or brotli-compressed when the client accepts it
+RESPONSE_COMPRESSION_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024"))
+RESPONSE_GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "5"))
+RESPONSE_BROTLI_QUALITY = int(os.getenv("RESPONSE_BROTLI_QUALITY", "4"))
+
+# Conversation session store
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "1800"))
+SESSION_MAX_COUNT = int(os.getenv("SESSION_MAX_COUNT", "10000"))
+
+# Natural-language -> SQL answer cache (set SQL_CACHE_PATH to persist it across restarts)
+SQL_CACHE_MAX_ENTRIES = int(os.getenv("SQL_CACHE_MAX_ENTRIES", "5000"))
+SQL_CACHE_TTL_SECONDS = float(os.getenv("SQL_CACHE_TTL_SECONDS", "86400"))
+SQL_CACHE_PATH = os.getenv("SQL_CACHE_PATH", "")
+SQL_CACHE_SAVE_INTERVAL = float(os.getenv("SQL_CACHE_SAVE_INTERVAL", "30"))
+
+# Near-duplicate question index (reuses validated SQL above the similarity threshold)
+SIMILARITY_ENABLED = os.getenv("SIMILARITY_ENABLED", "true").lower() == "true"
+SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.9"))
+SIMILARITY_MAX_ENTRIES = int(os.getenv("SIMILARITY_MAX_ENTRIES", "100000"))
+SIMILARITY_NGRAM_SIZE = int(os.getenv("SIMILARITY_NGRAM_SIZE", "3"))
+
+# Template fast path: common question shapes are answered with prepared SQL, without the model
+TEMPLATES_ENABLED = os.getenv("TEMPLATES_ENABLED", "true").lower() == "true"
+
+# Prompt schema pruning: only tables relevant to the question (plus FK neighbours) are sent
+SCHEMA_PRUNING_ENABLED = os.getenv("SCHEMA_PRUNING_ENABLED", "true").lower() == "true"
+SCHEMA_TOKEN_BUDGET = int(os.getenv("SCHEMA_TOKEN_BUDGET", "1500"))
+SCHEMA_FK_HOPS = int(os.getenv("SCHEMA_FK_HOPS", "1"))
+
 logger = logging.getLogger(__name__)
 logger.info(" Database URL configured for PostgreSQL")
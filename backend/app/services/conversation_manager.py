@@ -0,0 +1,129 @@
+import time
+import uuid
+import heapq
+import logging
+import threading
+from typing import Dict, Any, Optional
+from .config import SESSION_TTL_SECONDS, SESSION_MAX_COUNT
+
+logger = logging.getLogger(__name__)
+
+class ConversationState:
+    """
+    Conversation state for a single chat session: the INSERT query waiting for
+    field values and the last response (used to answer follow-up questions).
+    """
+
+    __slots__ = ("session_id", "pending_insert_query", "last_query_context", "last_access")
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.pending_insert_query: Optional[Dict[str, Any]] = None
+        self.last_query_context: Optional[Dict[str, Any]] = None
+        self.last_access = time.monotonic()
+
+    def touch(self) -> None:
+        """Mark the session as recently used."""
+        self.last_access = time.monotonic()
+
+
+class ConversationManager:
+    """
+    Bounded store of per-session conversation state.
+
+    Reads are a plain dict lookup and never take the lock; only creating and
+    evicting sessions is serialized. Sessions expire after ``ttl_seconds`` of
+    inactivity, and when the store is full the least recently used sessions
+    are evicted in batches.
+    """
+
+    def __init__(self, max_sessions: int = SESSION_MAX_COUNT, ttl_seconds: float = SESSION_TTL_SECONDS):
+        self.max_sessions = max(1, max_sessions)
+        self.ttl_seconds = ttl_seconds
+        self._sessions: Dict[str, ConversationState] = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+        self._evicted = 0
+        self._expired = 0
+        logger.info(f" Initialized ConversationManager (max_sessions={self.max_sessions}, ttl={self.ttl_seconds}s)")
+
+    def _is_expired(self, state: ConversationState, now: float) -> bool:
+        return now - state.last_access > self.ttl_seconds
+
+    def get(self, session_id: Optional[str]) -> Optional[ConversationState]:
+        """Return the live state for a session, or None if unknown or expired."""
+        if not session_id:
+            return None
+
+        state = self._sessions.get(session_id)
+        if state is None or self._is_expired(state, time.monotonic()):
+            return None
+
+        state.touch()
+        return state
+
+    def get_or_create(self, session_id: Optional[str] = None) -> ConversationState:
+        """
+        Return the state for a session, creating it if needed.
+
+        Args:
+            session_id: Client-supplied session id; a new id is generated when missing
+
+        Returns:
+            The session's ConversationState
+        """
+        state = self.get(session_id)
+        if state is not None:
+            return state
+
+        session_id = session_id or uuid.uuid4().hex
+        with self._lock:
+            now = time.monotonic()
+            # Another request may have created it while we waited for the lock
+            state = self._sessions.get(session_id)
+            if state is not None and not self._is_expired(state, now):
+                state.touch()
+                return state
+
+            self._evict_locked(now)
+            state = ConversationState(session_id)
+            self._sessions[session_id] = state
+
+        return state
+
+    def remove(self, session_id: str) -> None:
+        """Drop a session's state."""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def _evict_locked(self, now: float) -> None:
+        """Expire idle sessions and make room for one more. Caller must hold the lock."""
+        # Sweep expired sessions at most once per TTL/10, or when the store is full
+        full = len(self._sessions) >= self.max_sessions
+        if full or now - self._last_sweep > self.ttl_seconds / 10:
+            expired = [sid for sid, state in self._sessions.items() if self._is_expired(state, now)]
+            for sid in expired:
+                del self._sessions[sid]
+            self._expired += len(expired)
+            self._last_sweep = now
+
+        if len(self._sessions) < self.max_sessions:
+            return
+
+        # Evict the least recently used 10% in one go so eviction cost is amortized
+        batch = max(1, self.max_sessions // 10)
+        oldest = heapq.nsmallest(batch, self._sessions.items(), key=lambda item: item[1].last_access)
+        for sid, _ in oldest:
+            del self._sessions[sid]
+        self._evicted += len(oldest)
+        logger.info(f" Evicted {len(oldest)} least recently used sessions")
+
+    def stats(self) -> Dict[str, Any]:
+        """Return session store counters."""
+        return {
+            "active_sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "ttl_seconds": self.ttl_seconds,
+            "expired": self._expired,
+            "evicted": self._evicted
+        }
@@ -0,0 +1,121 @@
+import logging
+from typing import Dict, List, Optional, Any
+from .config import COST_GATE_MAX_COST, COST_GATE_MAX_ROWS, COST_GATE_ACTION
+from .db_service import DatabaseService
+from .result_pager import ResultPager
+
+logger = logging.getLogger(__name__)
+
+def _seq_scans(node: Dict[str, Any]) -> List[str]:
+    """Relations read by sequential scans anywhere in a plan tree."""
+    found = [node["Relation Name"]] if node.get("Node Type") == "Seq Scan" and "Relation Name" in node else []
+    for child in node.get("Plans", []):
+        found.extend(_seq_scans(child))
+    return found
+
+def summarize_plan(node: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Summarize an EXPLAIN (FORMAT JSON) plan for a page query.
+
+    The page query ends in a LIMIT, so estimated_rows is taken from the node
+    under it: how many rows the query would produce without the page cap.
+    """
+    source = node["Plans"][0] if node.get("Node Type") == "Limit" and node.get("Plans") else node
+    return {
+        "node_type": source.get("Node Type"),
+        "startup_cost": source.get("Startup Cost", 0.0),
+        "total_cost": node.get("Total Cost", 0.0),
+        "unlimited_cost": source.get("Total Cost", 0.0),
+        "estimated_rows": source.get("Plan Rows", 0),
+        "seq_scans": sorted(set(_seq_scans(node)))
+    }
+
+
+class CostGate:
+    """
+    Checks the planner's estimates for generated SELECTs before running them.
+
+    The page query is planned with EXPLAIN (FORMAT JSON), under its own short
+    statement timeout. Queries estimated to cost more than max_cost, or to
+    produce more than max_rows rows, are refused with action "refuse". With
+    action "limit", rows are already capped by the page, so only cost counts:
+    the page is shrunk until its share of the query's cost fits, and the query
+    is refused only if even its startup cost (sorting, hashing, aggregating
+    everything before the first row) is over the limit. Further pages stay
+    reachable through the page token. When no plan is available (another
+    database, or EXPLAIN failed) queries pass unchecked.
+    """
+
+    def __init__(self, db_service: DatabaseService, result_pager: ResultPager, max_cost: float = COST_GATE_MAX_COST,
+                 max_rows: float = COST_GATE_MAX_ROWS, action: str = COST_GATE_ACTION):
+        if action not in ("refuse", "limit"):
+            raise ValueError(f"Unknown COST_GATE_ACTION '{action}' (expected 'refuse' or 'limit')")
+        self.db_service = db_service
+        self.result_pager = result_pager
+        self.max_cost = max_cost
+        self.max_rows = max_rows
+        self.action = action
+        self.counts = {"checked": 0, "unchecked": 0, "limited": 0, "refused": 0}
+
+    def _fitting_page_size(self, summary: Dict[str, Any], page_size: int) -> int:
+        """Largest page (up to page_size) whose estimated cost stays within max_cost; 0 if none does."""
+        startup = summary["startup_cost"]
+        if startup >= self.max_cost:
+            return 0
+        per_row = (summary["unlimited_cost"] - startup) / max(summary["estimated_rows"], 1)
+        if per_row <= 0:
+            return page_size
+        return min(page_size, int((self.max_cost - startup) / per_row))
+
+    async def check(self, page_plan: Dict[str, Any], sql_query: str, params: Optional[Dict[str, Any]] = None,
+                    after: Any = None) -> Dict[str, Any]:
+        """
+        Check a planned page of a SELECT against the cost limits.
+
+        Args:
+            page_plan: The page plan from ResultPager.plan
+            sql_query: The original SELECT
+            params: Its bind parameters
+            after: Last key of the previous page, as passed to ResultPager.plan
+
+        Returns:
+            Dict with the "plan" to run (possibly with a smaller page), the plan
+            "summary" (None if unchecked) and an "error" if the query is refused
+        """
+        node = await self.db_service.explain_query(page_plan["sql"], page_plan["params"])
+        if node is None:
+            self.counts["unchecked"] += 1
+            return {"plan": page_plan, "summary": None, "error": None}
+
+        self.counts["checked"] += 1
+        summary = summarize_plan(node)
+        over_cost = summary["total_cost"] > self.max_cost
+        over_rows = summary["estimated_rows"] > self.max_rows
+        if not over_cost and (not over_rows or self.action == "limit"):
+            return {"plan": page_plan, "summary": {**summary, "action": "allowed"}, "error": None}
+
+        if self.action == "limit":
+            page_size = self._fitting_page_size(summary, page_plan["page_size"])
+            if page_size >= 1:
+                self.counts["limited"] += 1
+                logger.info(f" Estimated cost {summary['total_cost']:.0f} is over {self.max_cost:.0f}, "
+                            f"limiting the page to {page_size} rows")
+                limited_plan = self.result_pager.plan(sql_query, params, after, page_size=page_size)
+                return {"plan": limited_plan, "summary": {**summary, "action": "limited", "page_size": page_size},
+                        "error": None}
+
+        self.counts["refused"] += 1
+        if over_cost:
+            reason = f"its estimated cost ({summary['total_cost']:.0f}) is over the limit of {self.max_cost:.0f}"
+        else:
+            reason = f"it is estimated to return {summary['estimated_rows']} rows (limit {self.max_rows:.0f})"
+        logger.warning(f" Refused query: {reason}")
+        return {
+            "plan": page_plan,
+            "summary": {**summary, "action": "refused"},
+            "error": f"This query was not run because {reason}. Try a more specific question."
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the thresholds and how many queries were checked, limited and refused."""
+        return {"max_cost": self.max_cost, "max_rows": self.max_rows, "action": self.action, **self.counts}
@@ -0,0 +1,121 @@
+import time
+import logging
+from typing import Dict, Any
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from .config import (DATABASE_URL, ASYNC_DATABASE_URL, DB_POOL_SIZES, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING,
+                     DB_STATEMENT_CACHE_SIZE)
+from .metrics import RollingStats
+
+logger = logging.getLogger(__name__)
+
+class _MeteredPool:
+    """Pool mixin that records how long each checkout waited for a connection, and peak usage."""
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.checkout_wait_ms = RollingStats()
+        self.checkout_timeouts = 0
+        self.peak_checked_out = 0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            record = super()._do_get()
+            self.peak_checked_out = max(self.peak_checked_out, self.checkedout())
+            return record
+        except PoolTimeoutError:
+            self.checkout_timeouts += 1
+            raise
+        finally:
+            self.checkout_wait_ms.record((time.perf_counter() - started) * 1000)
+
+
+class MeteredQueuePool(_MeteredPool, QueuePool):
+    pass
+
+
+class MeteredAsyncQueuePool(_MeteredPool, AsyncAdaptedQueuePool):
+    pass
+
+
+# One engine (and so one pool) per URL for the whole process
+_engines: Dict[str, Engine] = {}
+_async_engines: Dict[str, AsyncEngine] = {}
+_roles: Dict[str, str] = {}
+
+def _pool_options(role: str) -> Dict[str, Any]:
+    pool_size, max_overflow = DB_POOL_SIZES[role]
+    return {
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING
+    }
+
+def get_engine(url: str = DATABASE_URL) -> Engine:
+    """Shared sync engine (startup introspection and the INSERT handler's lookups)."""
+    if url not in _engines:
+        _engines[url] = create_engine(url, poolclass=MeteredQueuePool, **_pool_options("sync"))
+        _roles[url] = "sync"
+    return _engines[url]
+
+def get_async_engine(url: str = ASYNC_DATABASE_URL, role: str = "primary") -> AsyncEngine:
+    """
+    Shared async engine for a database URL.
+
+    Args:
+        url: Async driver URL
+        role: "primary" or "replica", which selects the pool size settings
+
+    Returns:
+        The process-wide engine for the URL, created on first use
+    """
+    if url not in _async_engines:
+        connect_args = {}
+        if url.startswith("postgresql+asyncpg"):
+            # Parameterized statements are prepared once per connection and reused from this cache
+            connect_args["prepared_statement_cache_size"] = DB_STATEMENT_CACHE_SIZE
+        _async_engines[url] = create_async_engine(url, poolclass=MeteredAsyncQueuePool, connect_args=connect_args,
+                                                  **_pool_options(role))
+        _roles[url] = role
+        logger.info(f" Created {role} connection pool (size {DB_POOL_SIZES[role][0]}, "
+                    f"overflow {DB_POOL_SIZES[role][1]})")
+    return _async_engines[url]
+
+async def dispose_engines() -> None:
+    """Close every pooled connection (on shutdown)."""
+    for engine in _async_engines.values():
+        await engine.dispose()
+    for engine in _engines.values():
+        engine.dispose()
+
+def _pool_stats(url: str, pool: Any) -> Dict[str, Any]:
+    capacity = pool.size() + max(pool._max_overflow, 0)
+    checked_out = pool.checkedout()
+    return {
+        "role": _roles[url],
+        "size": pool.size(),
+        "max_overflow": pool._max_overflow,
+        "checked_out": checked_out,
+        "peak_checked_out": pool.peak_checked_out,
+        "idle": pool.checkedin(),
+        "utilisation": round(checked_out / capacity, 4) if capacity else 0.0,
+        "checkout_wait_ms": pool.checkout_wait_ms.summary(),
+        "checkout_timeouts": pool.checkout_timeouts
+    }
+
+def pool_stats() -> Dict[str, Dict[str, Any]]:
+    """Return size, utilisation and checkout wait times for every shared pool, by host."""
+    stats = {}
+    for engines in (_async_engines, _engines):
+        for url, engine in engines.items():
+            pool = engine.pool
+            if isinstance(pool, _MeteredPool):
+                name = engine.url.render_as_string(hide_password=True)
+                stats[name] = _pool_stats(url, pool)
+    return stats
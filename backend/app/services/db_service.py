@@ -1,15 +1,47 @@
+import re
+import json
+import time
 import logging
-from typing import Optional, List, Dict, Any
-from sqlalchemy import create_engine, text, inspect
-from sqlalchemy.exc import SQLAlchemyError
-from .config import DATABASE_URL
+from typing import AsyncIterator, Optional, List, Dict, Tuple, Any
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError, ProgrammingError, DataError, DBAPIError
+from .config import DATABASE_URL, DB_FETCH_BATCH_SIZE, RESULT_CACHE_ENABLED, SQL_PARAMETERIZE_ENABLED
+from .db_engine import get_engine, get_async_engine
+from .result_cache import ResultCache, table_written
+from .reference_data import DepartmentNames
+from .query_guard import QueryGuard
+from .replica_router import ReplicaRouter
+from .sql_parameterizer import QueryShapes, parameterize, needs_literals
+from .schema_introspection import get_schema_snapshot
 
 logger = logging.getLogger(__name__)
 
+# Department names are added to rows with employee and department_identifier columns; a query can only
+# return those if it names them (or selects every column)
+_EMPLOYEE = re.compile(r"employee", re.IGNORECASE)
+_DEPARTMENT_COLUMN = re.compile(r"department_identifier|\*", re.IGNORECASE)
+
 class DatabaseService:
     def __init__(self):
+        # Per-table schema pieces, filled in by get_database_schema
+        self.schema_tables: Dict[str, Dict[str, Any]] = {}
+        # Repeated SELECTs are served from memory until a write touches one of their tables
+        self.result_cache = ResultCache() if RESULT_CACHE_ENABLED else None
+        # Per-template stats, and the templates whose literals have to stay inline
+        self.query_shapes = QueryShapes()
         try:
-            self.engine = create_engine(DATABASE_URL)
+            # Engines (and their pools) are shared with the other services
+            self.engine = get_engine()
+            # Async engine for the request path; the sync engine is only used at startup
+            self.async_engine = get_async_engine()
+            # SELECTs go to read replicas when any are configured; writes stay on the primary
+            self.replicas = ReplicaRouter(self.async_engine)
+            # Statement timeouts, and cancellation of queries nobody is waiting for any more
+            self.query_guard = QueryGuard(self.async_engine)
+            # Department names shown next to employee rows, shared by every query
+            self.departments = DepartmentNames(self.async_engine)
+            if self.result_cache is not None:
+                self.departments.add_listener(lambda: self.result_cache.invalidate_table("department"))
             logger.info(" Initialized Database Service with PostgreSQL")
 
             # Test the connection
@@ -21,9 +53,10 @@ class DatabaseService:
             print(f"\nDATABASE CONNECTION INFO:")
             print(f"URL: {DATABASE_URL}")
 
-            # Print the tables in the database
-            inspector = inspect(self.engine)
-            tables = inspector.get_table_names()
+            # Print the tables in the database (the schema snapshot is shared with the other services)
+            tables = get_schema_snapshot(self.engine).tables
+            if self.result_cache is not None:
+                self.result_cache.known_tables = {table.lower() for table in tables}
             print(f"Tables found in database: {len(tables)}")
             if tables:
                 print("Table list:")
@@ -38,8 +71,18 @@ class DatabaseService:
             print(f"Check your database configuration in config.py")
             print(f"Current DATABASE_URL: {DATABASE_URL}")
 
-    def execute_query(self, query: str) -> Dict[str, Any]:
-        """Execute a SQL query and return the results in a formatted way."""
+    def start(self) -> None:
+        """Start background refresh of reference data and replica lag checks (needs a running event loop)."""
+        self.departments.start()
+        self.replicas.start()
+
+    async def close(self) -> None:
+        """Stop background work (the shared pools are disposed by dispose_engines)."""
+        await self.departments.close()
+        await self.replicas.close()
+
+    async def execute_query(self, query: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Execute a SQL query (with optional bind parameters) and return the results in a formatted way."""
         try:
             logger.info(f"🔍 Executing SQL query: {query}")
 
@@ -56,62 +99,27 @@ class DatabaseService:
                 is_modification_query = True
                 query_type = "DELETE"
 
-            with self.engine.connect() as connection:
-                # Start a transaction
-                trans = connection.begin()
+            if not is_modification_query:
+                if self.result_cache is None:
+                    return await self._select(query, params)
+                # Keyed by the template and its values, so the same shape and values hit however they were written.
+                # Results that got department names from the reference map are invalidated by department writes too
+                template, bound = self._statements(query, params)[0]
+                return await self.result_cache.get_or_load(
+                    template, bound, lambda: self._select(query, params),
+                    extra_tables=lambda result: {"department"} if "department_name" in result.get("columns", []) else set())
+
+            statements = self._statements(query, params)
+            for attempt, (statement, bound) in enumerate(statements):
                 try:
-                    result = connection.execute(text(query))
-
-                    # For data modification queries, get the row count and commit
-                    if is_modification_query:
-                        row_count = result.rowcount
-                        trans.commit()
-
-                        logger.info(f" {query_type} query executed successfully. Affected {row_count} rows")
-                        return {
-                            "success": True,
-                            "query_type": query_type,
-                            "row_count": row_count,
-                            "columns": [],
-                            "results": [],
-                            "message": f"{query_type} operation successful. {row_count} rows affected.",
-                            "error": None
-                        }
-
-                    # For SELECT queries, fetch the results
-                    else:
-                        # Get column names
-                        columns = result.keys()
-
-                        # Fetch all rows
-                        rows = result.fetchall()
-
-                        # Convert rows to list of dicts for easier handling
-                        results = [dict(zip(columns, row)) for row in rows]
-
-                        # Check if this is an employee query and enhance with department names
-                        if any('employee' in col.lower() for col in columns):
-                            results = self.enhance_employee_data(results)
-                            # Update columns to include department_name if it was added
-                            if results and 'department_name' in results[0] and 'department_name' not in columns:
-                                columns = list(columns) + ['department_name']
-
-                        # Format response
-                        response = {
-                            "success": True,
-                            "query_type": "SELECT",
-                            "row_count": len(results),
-                            "columns": columns,
-                            "results": results,
-                            "error": None
-                        }
-
-                        logger.info(f" SELECT query executed successfully. Retrieved {len(results)} rows")
-                        return response
-                except Exception as e:
-                    # Rollback the transaction if there's an error
-                    trans.rollback()
-                    raise e
+                    result = await self._write(statement, bound, query_type)
+                except DBAPIError as e:
+                    if attempt + 1 < len(statements) and needs_literals(e):
+                        continue
+                    raise
+                if attempt:
+                    self.query_shapes.mark_inline(statements[0][0])
+                return result
 
         except SQLAlchemyError as e:
             error_msg = str(e)
@@ -125,6 +133,180 @@ class DatabaseService:
                 "error": error_msg
             }
 
+    def _statements(self, query: str, params: Optional[Dict[str, Any]] = None) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Forms of a statement to try, in order.
+
+        First its template with the literals bound as parameters, so every run
+        of the same shape shares one prepared statement and plan; then the
+        statement as written, for shapes whose literals don't bind (a bound
+        value takes the column's type, where a literal would be coerced). Only
+        the statement as written when parameterizing is off, finds no literals,
+        or the shape is known to need them inline.
+        """
+        statement = (query, params or {})
+        if not SQL_PARAMETERIZE_ENABLED:
+            return [statement]
+        template, bound = parameterize(query, params)
+        if template == query or self.query_shapes.runs_inline(template):
+            return [statement]
+        return [(template, bound), statement]
+
+    async def _write(self, query: str, params: Dict[str, Any], query_type: str) -> Dict[str, Any]:
+        """Run an INSERT, UPDATE or DELETE in its own transaction on the primary."""
+        started = time.perf_counter()
+        async with self.async_engine.connect() as connection:
+            # Start a transaction
+            trans = await connection.begin()
+            try:
+                async with self.query_guard.guard(connection, query_type):
+                    result = await connection.execute(text(query), params)
+
+                # For data modification queries, get the row count and commit
+                row_count = result.rowcount
+                await trans.commit()
+            except Exception as e:
+                # Rollback the transaction if there's an error
+                await trans.rollback()
+                raise e
+
+        self.replicas.note_write()
+        self.query_shapes.record(query, (time.perf_counter() - started) * 1000, parameterized=bool(params))
+        written_table = table_written(query)
+        if self.result_cache is not None and written_table:
+            self.result_cache.invalidate_table(written_table)
+        if written_table == "department":
+            self.departments.invalidate()
+
+        logger.info(f" {query_type} query executed successfully. Affected {row_count} rows")
+        return {
+            "success": True,
+            "query_type": query_type,
+            "row_count": row_count,
+            "columns": [],
+            "results": [],
+            "message": f"{query_type} operation successful. {row_count} rows affected.",
+            "error": None
+        }
+
+    async def _select(self, query: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Run a SELECT and collect its rows, fetched through a server-side cursor in batches."""
+        columns = []
+        results = []
+        async for batch in self.stream_query(query, params, DB_FETCH_BATCH_SIZE):
+            if "columns" in batch:
+                columns = batch["columns"]
+            else:
+                results.extend(batch["rows"])
+
+        logger.info(f" SELECT query executed successfully. Retrieved {len(results)} rows")
+        return {
+            "success": True,
+            "query_type": "SELECT",
+            "row_count": len(results),
+            "columns": columns,
+            "results": results,
+            "error": None
+        }
+
+    async def stream_query(self, query: str, params: Optional[Dict[str, Any]] = None,
+                           batch_size: int = DB_FETCH_BATCH_SIZE) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Run a SELECT through a server-side cursor and yield its rows in batches.
+
+        The first item is {"columns": [...]}, followed by {"rows": [...]} batches
+        of at most batch_size row dicts, so memory stays bounded by the batch
+        size rather than the result size. Employee rows get a department_name
+        column, as in execute_query. Database errors (including QueryDeadlineError)
+        are raised.
+        """
+        # Fetched before taking a connection: a (re)load needs one of its own, and holding ours meanwhile
+        # could exhaust the pool under load. Only queries that can return employee rows with their
+        # department_identifier need it.
+        may_show_departments = _EMPLOYEE.search(query) and _DEPARTMENT_COLUMN.search(query)
+        department_names = await self.get_departments() if may_show_departments else None
+        started = time.perf_counter()
+        statements = self._statements(query, params)
+        for attempt, (statement, bound) in enumerate(statements):
+            async with self.replicas.read_engine().connect() as connection, self.query_guard.guard(connection, "SELECT"):
+                try:
+                    result = await connection.stream(text(statement), bound, execution_options={"yield_per": batch_size})
+                except DBAPIError as e:
+                    # The failed statement aborted this transaction; the next form gets a fresh one
+                    if attempt + 1 < len(statements) and needs_literals(e):
+                        continue
+                    raise
+                if attempt:
+                    self.query_shapes.mark_inline(statements[0][0])
+                columns = list(result.keys())
+
+                # Employee rows are annotated with department names from the shared map
+                departments = None
+                if any('employee' in col.lower() for col in columns) and 'department_identifier' in columns:
+                    departments = department_names
+                if departments and 'department_name' not in columns:
+                    columns.append('department_name')
+                yield {"columns": columns}
+
+                async for partition in result.partitions(batch_size):
+                    rows = [row._asdict() for row in partition]
+                    if departments:
+                        for row in rows:
+                            row['department_name'] = departments.get(row['department_identifier'], 'Unknown')
+                    yield {"rows": rows}
+
+            self.query_shapes.record(statement, (time.perf_counter() - started) * 1000, parameterized=bool(bound))
+            return
+
+    async def validate_query(self, query: str) -> Optional[str]:
+        """
+        Check that a query parses and plans against the database without running it.
+
+        Returns:
+            The database error message if the query is invalid, None if it is valid
+            (or if it couldn't be checked, e.g. because the database is unreachable)
+        """
+        try:
+            async with self.replicas.read_engine().connect() as connection:
+                # EXPLAIN plans the statement without executing it; the transaction is rolled back on close
+                await connection.execute(text(f"EXPLAIN {query.strip().rstrip(';')}"))
+            return None
+        except (ProgrammingError, DataError) as e:
+            return str(e.orig) if e.orig is not None else str(e)
+        except SQLAlchemyError as e:
+            logger.warning(f" Could not validate query: {str(e)}")
+            return None
+
+    async def explain_query(self, query: str, params: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Get the planner's estimates for a query without running it (PostgreSQL only).
+
+        Returns:
+            The top node of the EXPLAIN (FORMAT JSON) plan, or None if there is no
+            plan (another database, an invalid query, or planning timed out)
+        """
+        if self.async_engine.dialect.name != "postgresql":
+            return None
+        # Planned in the form it will run in, bound parameters and all
+        statements = self._statements(query, params)
+        for attempt, (statement, bound) in enumerate(statements):
+            try:
+                async with self.replicas.read_engine().connect() as connection, self.query_guard.guard(connection, "EXPLAIN"):
+                    result = await connection.execute(text(f"EXPLAIN (FORMAT JSON) {statement.strip().rstrip(';')}"),
+                                                      bound)
+                    plan = result.scalar()
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                return plan[0]["Plan"]
+            except DBAPIError as e:
+                if attempt + 1 < len(statements) and needs_literals(e):
+                    continue
+                logger.warning(f" Could not plan query: {str(e)}")
+                return None
+            except SQLAlchemyError as e:
+                logger.warning(f" Could not plan query: {str(e)}")
+                return None
+
     def format_results_as_markdown(self, query_results: Dict[str, Any]) -> str:
         """Format query results as a markdown table for chat display."""
         if not query_results["success"]:
@@ -197,56 +379,29 @@ class DatabaseService:
             }
         }
 
-    def get_departments(self) -> Dict[int, str]:
-        """Get a mapping of department IDs to department names."""
-        try:
-            with self.engine.connect() as connection:
-                result = connection.execute(text("SELECT department_identifier, department_name FROM department"))
-                departments = {row[0]: row[1] for row in result.fetchall()}
-                return departments
-        except SQLAlchemyError as e:
-            logger.error(f" Error fetching departments: {str(e)}")
-            return {}
-
-    def enhance_employee_data(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Enhance employee data with department names."""
-        if not results:
-            return results
-
-        # Check if this is employee data with department_identifier
-        if not all('department_identifier' in row for row in results):
-            return results
-
-        # Get department mapping
-        departments = self.get_departments()
-        if not departments:
-            return results
-
-        # Enhance each row with department name
-        enhanced_results = []
-        for row in results:
-            enhanced_row = row.copy()
-            dept_id = row.get('department_identifier')
-            if dept_id in departments:
-                enhanced_row['department_name'] = departments[dept_id]
-            else:
-                enhanced_row['department_name'] = 'Unknown'
-            enhanced_results.append(enhanced_row)
-
-        return enhanced_results
+    async def get_departments(self) -> Dict[int, str]:
+        """Get a mapping of department IDs to department names (shared; don't modify it)."""
+        return await self.departments.get()
 
     def get_database_schema(self) -> str:
-        """Fetch the database schema including tables, columns, and their types."""
+        """
+        Fetch the database schema including tables, columns, and their types (from the shared schema snapshot).
+
+        The per-table pieces are also kept in self.schema_tables (column names,
+        referenced tables, primary key and the formatted text block) so prompts
+        can include only the relevant tables and results can be paged.
+        """
+        self.schema_tables = {}
         try:
             print("\n" + "="*80)
             print("FETCHING DATABASE SCHEMA...")
             print("="*80)
 
-            inspector = inspect(self.engine)
+            snapshot = get_schema_snapshot(self.engine)
             schema_info = []
 
             # Get all tables
-            tables = inspector.get_table_names()
+            tables = snapshot.tables
             if not tables:
                 error_msg = "No tables found in the database!"
                 print(f"ERROR: {error_msg}")
@@ -257,13 +412,13 @@ class DatabaseService:
             for table_name in tables:
                 print(f"Processing table: {table_name}")
                 try:
-                    columns = inspector.get_columns(table_name)
-                    foreign_keys = inspector.get_foreign_keys(table_name)
-                    primary_key = inspector.get_pk_constraint(table_name)
+                    columns = snapshot.columns[table_name]
+                    foreign_keys = snapshot.foreign_keys[table_name]
+                    primary_key = snapshot.primary_keys[table_name]
 
                     print(f"  - Columns: {len(columns)}")
                     print(f"  - Foreign keys: {len(foreign_keys)}")
-                    print(f"  - Primary key: {primary_key['constrained_columns'] if primary_key['constrained_columns'] else 'None'}")
+                    print(f"  - Primary key: {primary_key if primary_key else 'None'}")
 
                     # Get sample data for reference tables
                     sample_data = ""
@@ -286,7 +441,7 @@ class DatabaseService:
                     column_info = []
                     for col in columns:
                         constraints = []
-                        if col['name'] in primary_key['constrained_columns']:
+                        if col['name'] in primary_key:
                             constraints.append('PRIMARY KEY')
                         if col.get('nullable') is False:
                             constraints.append('NOT NULL')
@@ -306,7 +461,14 @@ class DatabaseService:
                         column_info.append(f"    FOREIGN KEY ({', '.join(constrained_cols)}) REFERENCES {referred_table}({', '.join(referred_cols)})")
 
                     # Add table schema to the list
-                    schema_info.append(f"Table: {table_name}\n" + "\n".join(column_info) + sample_data)
+                    table_text = f"Table: {table_name}\n" + "\n".join(column_info) + sample_data
+                    schema_info.append(table_text)
+                    self.schema_tables[table_name] = {
+                        "columns": [col['name'] for col in columns],
+                        "referenced_tables": [fk['referred_table'] for fk in foreign_keys],
+                        "primary_key": list(primary_key),
+                        "text": table_text
+                    }
 
                 except Exception as e:
                     error_msg = str(e)
@@ -326,15 +488,11 @@ class DatabaseService:
             # Also print foreign key relationships
             fk_info = []
             for table_name in tables:
-                try:
-                    foreign_keys = inspector.get_foreign_keys(table_name)
-                    for fk in foreign_keys:
-                        referred_table = fk['referred_table']
-                        constrained_cols = fk['constrained_columns']
-                        referred_cols = fk['referred_columns']
-                        fk_info.append(f"{table_name}.{constrained_cols[0]} -> {referred_table}.{referred_cols[0]}")
-                except Exception as e:
-                    logger.error(f"Error getting foreign keys for {table_name}: {str(e)}")
+                for fk in snapshot.foreign_keys[table_name]:
+                    referred_table = fk['referred_table']
+                    constrained_cols = fk['constrained_columns']
+                    referred_cols = fk['referred_columns']
+                    fk_info.append(f"{table_name}.{constrained_cols[0]} -> {referred_table}.{referred_cols[0]}")
 
             if fk_info:
                 print("\nForeign Key Relationships:")
@@ -1,12 +1,34 @@
 import re
 import logging
+from datetime import date, datetime, time
+from decimal import Decimal, InvalidOperation
 from typing import Dict, List, Tuple, Optional, Any
-from sqlalchemy import create_engine, text, inspect
-from .config import DATABASE_URL
+from sqlalchemy import text, inspect
+from sqlalchemy.engine import Connection
+from .db_engine import get_engine, get_async_engine
+from .schema_introspection import get_schema_snapshot
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Column type names (lowercase, without length/precision) that user input is converted for
+_INTEGER_TYPES = {"integer", "int", "int2", "int4", "int8", "smallint", "bigint", "serial", "smallserial", "bigserial"}
+_FLOAT_TYPES = {"float", "float4", "float8", "real", "double precision", "double"}
+_NUMERIC_TYPES = {"numeric", "decimal"}
+_BOOLEAN_TYPES = {"boolean", "bool"}
+_DATE_TYPES = {"date"}
+_TIMESTAMP_TYPES = {"timestamp", "timestamp without time zone", "datetime"}
+_TIME_TYPES = {"time", "time without time zone"}
+_TEXT_TYPES = {"text", "varchar", "character varying", "char", "character", "bpchar", "citext", "name", "string",
+               "unknown"}
+# A type name that is safe to write into a CAST
+_TYPE_NAME = re.compile(r"[A-Za-z][A-Za-z0-9_ ]*(?:\(\s*\d+\s*(?:,\s*\d+\s*)?\))?(?:[A-Za-z ]*)(?:\[\])?")
+
+def _base_type(col_type: str) -> str:
+    """Lowercase type name without length, precision or array brackets ("NUMERIC(10, 2)" -> "numeric")."""
+    base = re.sub(r"\(.*?\)|\[\]", "", col_type.lower())
+    return " ".join(base.split())
+
 class InsertQueryHandler:
     """
     Handler for INSERT queries that detects missing values and helps collect them
@@ -14,7 +36,10 @@ class InsertQueryHandler:
     """
 
     def __init__(self):
-        self.engine = create_engine(DATABASE_URL)
+        # Shared with DatabaseService, so the process keeps one pool per database
+        self.engine = get_engine()
+        # Async engine for lookups made while serving a request
+        self.async_engine = get_async_engine()
         logger.info(" Initialized InsertQueryHandler")
 
         # Cache for table schemas
@@ -29,7 +54,7 @@ class InsertQueryHandler:
         # Print foreign key relationships for debugging
         self._print_foreign_key_relationships()
 
-    def analyze_insert_query(self, query: str) -> Dict[str, Any]:
+    async def analyze_insert_query(self, query: str) -> Dict[str, Any]:
         """
         Analyze an INSERT query to detect missing values and required fields.
 
@@ -43,7 +68,7 @@ class InsertQueryHandler:
             logger.info(f"Analyzing INSERT query: {query}")
 
             # Extract table name and columns from the query
-            table_name, columns, values = self._parse_insert_query(query)
+            table_name, columns, values = await self._parse_insert_query(query)
 
             if not table_name:
                 logger.warning("Could not determine target table for INSERT query")
@@ -54,7 +79,7 @@ class InsertQueryHandler:
                 }
 
             # Get table schema
-            table_schema = self._get_table_schema(table_name)
+            table_schema = await self._get_table_schema(table_name)
 
             if not table_schema:
                 logger.warning(f"Table '{table_name}' not found in database")
@@ -158,7 +183,7 @@ class InsertQueryHandler:
                 "query": query
             }
 
-    def _parse_insert_query(self, query: str) -> Tuple[Optional[str], List[str], List[str]]:
+    async def _parse_insert_query(self, query: str) -> Tuple[Optional[str], List[str], List[str]]:
         """
         Parse an INSERT query to extract table name, columns, and values.
 
@@ -193,7 +218,7 @@ class InsertQueryHandler:
             if alt_match:
                 table_name = alt_match.group(1)
                 # Get all columns from the table schema
-                table_schema = self._get_table_schema(table_name)
+                table_schema = await self._get_table_schema(table_name)
                 if table_schema:
                     columns = list(table_schema.keys())
                     values = [val.strip() for val in alt_match.group(2).split(',')]
@@ -208,7 +233,7 @@ class InsertQueryHandler:
             logger.error(f"Error parsing INSERT query: {str(e)}")
             return None, [], []
 
-    def _get_table_schema(self, table_name: str) -> Dict[str, Dict[str, Any]]:
+    async def _get_table_schema(self, table_name: str) -> Dict[str, Dict[str, Any]]:
         """
         Get the schema for a specific table.
 
@@ -223,7 +248,33 @@ class InsertQueryHandler:
             return self._table_schemas[table_name]
 
         try:
-            inspector = inspect(self.engine)
+            # Inspector is sync-only, so run it on the async connection's greenlet
+            async with self.async_engine.connect() as connection:
+                return await connection.run_sync(self._inspect_table_schema, table_name)
+
+        except Exception as e:
+            logger.error(f"Error getting schema for table {table_name}: {str(e)}")
+            return {}
+
+    def _inspect_table_schema(self, connection: Connection, table_name: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Inspect a table's schema and cache it along with its foreign key reference data.
+
+        Args:
+            connection: Sync connection to inspect with
+            table_name: Name of the table
+
+        Returns:
+            Dict mapping column names to their properties
+        """
+        snapshot = get_schema_snapshot(connection)
+        if table_name in snapshot:
+            columns = snapshot.columns[table_name]
+            primary_keys = snapshot.primary_keys[table_name]
+            foreign_keys = snapshot.foreign_keys[table_name]
+        else:
+            # Not in the snapshot (e.g. created since startup): inspect just this table
+            inspector = inspect(connection)
 
             # Check if table exists
             if table_name not in inspector.get_table_names():
@@ -236,52 +287,49 @@ class InsertQueryHandler:
             # Get foreign keys
             foreign_keys = inspector.get_foreign_keys(table_name)
 
-            # Build schema dict
-            schema = {}
-            for col in columns:
-                is_pk = col['name'] in primary_keys
-
-                # Check if this column is a foreign key
-                is_fk = False
-                fk_info = None
-                for fk in foreign_keys:
-                    if col['name'] in fk['constrained_columns']:
-                        is_fk = True
-                        fk_info = {
-                            "referred_table": fk['referred_table'],
-                            "referred_columns": fk['referred_columns'],
-                        }
-                        break
-
-                schema[col['name']] = {
-                    "type": col['type'],
-                    "nullable": col.get('nullable', True),
-                    "default": col.get('default'),
-                    "is_primary_key": is_pk,
-                    "is_autoincrement": col.get('autoincrement', False) and is_pk,
-                    "is_foreign_key": is_fk,
-                    "foreign_key_info": fk_info
-                }
+        # Build schema dict
+        schema = {}
+        for col in columns:
+            is_pk = col['name'] in primary_keys
+
+            # Check if this column is a foreign key
+            is_fk = False
+            fk_info = None
+            for fk in foreign_keys:
+                if col['name'] in fk['constrained_columns']:
+                    is_fk = True
+                    fk_info = {
+                        "referred_table": fk['referred_table'],
+                        "referred_columns": fk['referred_columns'],
+                    }
+                    break
+
+            schema[col['name']] = {
+                "type": col['type'],
+                "nullable": col.get('nullable', True),
+                "default": col.get('default'),
+                "is_primary_key": is_pk,
+                "is_autoincrement": col.get('autoincrement', False) and is_pk,
+                "is_foreign_key": is_fk,
+                "foreign_key_info": fk_info
+            }
 
-            # Cache the schema
-            self._table_schemas[table_name] = schema
+        # Cache the schema
+        self._table_schemas[table_name] = schema
 
-            # Cache foreign key relationships
-            self._cache_foreign_keys(table_name, foreign_keys)
+        # Cache foreign key relationships
+        self._cache_foreign_keys(table_name, foreign_keys, connection)
 
-            return schema
+        return schema
 
-        except Exception as e:
-            logger.error(f"Error getting schema for table {table_name}: {str(e)}")
-            return {}
-
-    def _cache_foreign_keys(self, table_name: str, foreign_keys: List[Dict[str, Any]]) -> None:
+    def _cache_foreign_keys(self, table_name: str, foreign_keys: List[Dict[str, Any]], connection: Optional[Connection] = None) -> None:
         """
         Cache foreign key relationships for a table.
 
         Args:
             table_name: Name of the table
             foreign_keys: List of foreign key dictionaries from SQLAlchemy
+            connection: Optional sync connection to load reference data with
         """
         if not table_name in self._foreign_keys:
             self._foreign_keys[table_name] = {}
@@ -297,9 +345,10 @@ class InsertQueryHandler:
                 }
 
                 # Load reference data for this foreign key
-                self._load_reference_data(table_name, col, referred_table, referred_col)
+                self._load_reference_data(table_name, col, referred_table, referred_col, connection)
 
-    def _load_reference_data(self, table_name: str, column: str, referred_table: str, referred_column: str) -> None:
+    def _load_reference_data(self, table_name: str, column: str, referred_table: str, referred_column: str,
+                             connection: Optional[Connection] = None) -> None:
         """
         Load reference data for a foreign key relationship.
 
@@ -308,6 +357,7 @@ class InsertQueryHandler:
             column: Name of the foreign key column
             referred_table: Name of the referenced table
             referred_column: Name of the referenced column
+            connection: Optional sync connection to query with (a new one is opened otherwise)
         """
         try:
             # Special handling for department references
@@ -323,55 +373,64 @@ class InsertQueryHandler:
                     return
 
                 # Query the database for reference data
-                with self.engine.connect() as connection:
-                    query = f"SELECT {referred_column}, {display_column} FROM {referred_table}"
-                    result = connection.execute(text(query))
-
-                    # Build a mapping of display values to IDs
-                    display_to_id = {}
-                    id_to_display = {}
-
-                    for row in result:
-                        id_val = row[0]
-                        display_val = row[1]
-
-                        # Store case-insensitive versions of the department name
-                        if isinstance(display_val, str):
-                            # Store the exact case version
-                            display_to_id[display_val] = id_val
-                            # Store the lowercase version
-                            display_to_id[display_val.lower()] = id_val
-                            # Store the title case version
-                            display_to_id[display_val.title()] = id_val
-                        else:
-                            display_to_id[display_val] = id_val
-
-                        id_to_display[id_val] = display_val
-
-                    # Cache the reference data
-                    self._reference_data[ref_key] = {
-                        "display_column": display_column,
-                        "display_to_id": display_to_id,
-                        "id_to_display": id_to_display
-                    }
+                query = f"SELECT {referred_column}, {display_column} FROM {referred_table}"
+                if connection is None:
+                    with self.engine.connect() as own_connection:
+                        rows = own_connection.execute(text(query)).fetchall()
+                else:
+                    rows = connection.execute(text(query)).fetchall()
+
+                # Build a mapping of display values to IDs
+                display_to_id = {}
+                id_to_display = {}
+
+                for row in rows:
+                    id_val = row[0]
+                    display_val = row[1]
+
+                    # Store case-insensitive versions of the department name
+                    if isinstance(display_val, str):
+                        # Store the exact case version
+                        display_to_id[display_val] = id_val
+                        # Store the lowercase version
+                        display_to_id[display_val.lower()] = id_val
+                        # Store the title case version
+                        display_to_id[display_val.title()] = id_val
+                    else:
+                        display_to_id[display_val] = id_val
+
+                    id_to_display[id_val] = display_val
+
+                # Cache the reference data
+                self._reference_data[ref_key] = {
+                    "referred_table": referred_table,
+                    "display_column": display_column,
+                    "display_to_id": display_to_id,
+                    "id_to_display": id_to_display
+                }
 
-                    # Print the loaded reference data for debugging
-                    print(f"\nLoaded department reference data:")
-                    print(f"  Table: {referred_table}")
-                    print(f"  Foreign key: {table_name}.{column} -> {referred_table}.{referred_column}")
-                    print(f"  Entries: {len(id_to_display)}")
-                    if id_to_display:
-                        print("  Department mappings:")
-                        for id_val, name in id_to_display.items():
-                            print(f"    ID {id_val} = '{name}'")
+                # Print the loaded reference data for debugging
+                print(f"\nLoaded department reference data:")
+                print(f"  Table: {referred_table}")
+                print(f"  Foreign key: {table_name}.{column} -> {referred_table}.{referred_column}")
+                print(f"  Entries: {len(id_to_display)}")
+                if id_to_display:
+                    print("  Department mappings:")
+                    for id_val, name in id_to_display.items():
+                        print(f"    ID {id_val} = '{name}'")
 
-                    logger.info(f"Loaded reference data for {ref_key}: {len(id_to_display)} entries")
+                logger.info(f"Loaded reference data for {ref_key}: {len(id_to_display)} entries")
 
         except Exception as e:
             error_msg = str(e)
             logger.error(f"Error loading reference data for {table_name}.{column}: {error_msg}")
             print(f"Error loading reference data for {table_name}.{column}: {error_msg}")
 
+    def invalidate_reference_data(self, referred_table: str) -> None:
+        """Drop cached reference data for a table so it is reloaded on next use."""
+        for ref_key in [key for key, data in self._reference_data.items() if data["referred_table"] == referred_table]:
+            del self._reference_data[ref_key]
+
     def get_display_value_for_foreign_key(self, table_name: str, column: str, id_value: Any) -> Optional[str]:
         """
         Get the display value for a foreign key ID.
@@ -399,17 +458,16 @@ class InsertQueryHandler:
 
         return ref_data["id_to_display"].get(id_value)
 
-    def get_id_for_display_value(self, table_name: str, column: str, display_value: str) -> Optional[Any]:
+    async def get_reference_data(self, table_name: str, column: str) -> Optional[Dict[str, Any]]:
         """
-        Get the ID for a display value.
+        Get the cached reference data for a foreign key column, loading it if needed.
 
         Args:
             table_name: Name of the table with the foreign key
             column: Name of the foreign key column
-            display_value: The display value to look up
 
         Returns:
-            The ID value, or None if not found
+            Dict with display_column, display_to_id and id_to_display, or None if unavailable
         """
         ref_key = f"{table_name}.{column}"
 
@@ -417,14 +475,36 @@ class InsertQueryHandler:
             logger.warning(f"No reference data found for {ref_key}")
             # Try to load the reference data
             if column == "department_identifier":
-                self._load_reference_data(table_name, column, "department", "department_identifier")
+                async with self.async_engine.connect() as connection:
+                    await connection.run_sync(
+                        lambda sync_connection: self._load_reference_data(
+                            table_name, column, "department", "department_identifier", sync_connection
+                        )
+                    )
                 if ref_key not in self._reference_data:
                     logger.error(f"Failed to load reference data for {ref_key}")
                     return None
             else:
                 return None
 
-        ref_data = self._reference_data[ref_key]
+        return self._reference_data[ref_key]
+
+    async def get_id_for_display_value(self, table_name: str, column: str, display_value: str) -> Optional[Any]:
+        """
+        Get the ID for a display value.
+
+        Args:
+            table_name: Name of the table with the foreign key
+            column: Name of the foreign key column
+            display_value: The display value to look up
+
+        Returns:
+            The ID value, or None if not found
+        """
+        ref_key = f"{table_name}.{column}"
+        ref_data = await self.get_reference_data(table_name, column)
+        if ref_data is None:
+            return None
 
         # Log the lookup attempt
         logger.info(f"Looking up ID for display value: '{display_value}' in {ref_key}")
@@ -489,11 +569,10 @@ class InsertQueryHandler:
                 print("="*80 + "\n")
                 return
 
-            inspector = inspect(self.engine)
-
-            # Get all tables
+            # Get all tables (the schema snapshot is shared with DatabaseService)
             try:
-                tables = inspector.get_table_names()
+                snapshot = get_schema_snapshot(self.engine)
+                tables = snapshot.tables
                 if not tables:
                     print("No tables found in the database!")
                     print("="*80 + "\n")
@@ -508,7 +587,7 @@ class InsertQueryHandler:
             fk_found = False
             for table_name in tables:
                 try:
-                    foreign_keys = inspector.get_foreign_keys(table_name)
+                    foreign_keys = snapshot.foreign_keys[table_name]
                     if foreign_keys:
                         fk_found = True
                         print(f"\nTable: {table_name}")
@@ -552,21 +631,26 @@ class InsertQueryHandler:
             print(f"Error printing foreign key relationships: {error_msg}")
             print("="*80 + "\n")
 
-    def generate_complete_query(self, analysis: Dict[str, Any], user_inputs: Dict[str, str]) -> str:
+    async def generate_complete_query(self, analysis: Dict[str, Any],
+                                      user_inputs: Dict[str, str]) -> Tuple[str, Dict[str, Any]]:
         """
         Generate a complete INSERT query with user-provided values.
 
+        User-provided values are bound as parameters (named after their column)
+        rather than written into the SQL, so they need no quoting or escaping.
+
         Args:
             analysis: The query analysis from analyze_insert_query
             user_inputs: Dict mapping column names to user-provided values
 
         Returns:
-            Complete SQL INSERT query
+            Tuple of (complete SQL INSERT query, its bind parameters)
         """
+        params: Dict[str, Any] = {}
         try:
             if not analysis.get("is_valid", False):
                 logger.warning(f"Cannot generate complete query: analysis is not valid")
-                return analysis.get("query", "")
+                return analysis.get("query", ""), {}
 
             table_name = analysis["table_name"]
             columns = list(analysis["columns"]) if "columns" in analysis else []  # Make a copy
@@ -578,7 +662,7 @@ class InsertQueryHandler:
             logger.info(f"User inputs: {user_inputs}")
 
             # Get table schema for type information
-            table_schema = self._get_table_schema(table_name)
+            table_schema = await self._get_table_schema(table_name)
             if not table_schema:
                 logger.warning(f"Could not get schema for table: {table_name}")
 
@@ -589,7 +673,9 @@ class InsertQueryHandler:
                     # Only add if not already in columns
                     if col_name not in columns:
                         columns.append(col_name)
-                        values.append(self._format_value(user_inputs[col_name], missing["type"]))
+                        values.append(self._bind_value(params, col_name,
+                                                       self._convert_value(user_inputs[col_name], missing["type"]),
+                                                       missing["type"]))
                         logger.info(f"Added missing required column: {col_name} = {user_inputs[col_name]}")
 
             # Update missing values
@@ -634,26 +720,27 @@ class InsertQueryHandler:
                         if is_foreign_key and fk_info and fk_info["referred_table"] == "department":
                             # For department references, convert department name to ID
                             department_name = user_inputs[col]
-                            department_id = self.get_id_for_display_value(table_name, col, department_name)
+                            department_id = await self.get_id_for_display_value(table_name, col, department_name)
 
                             if department_id is not None:
                                 logger.info(f"Converted department name '{department_name}' to ID {department_id}")
-                                formatted_value = str(department_id)
+                                formatted_value = self._bind_value(params, col, department_id)
                             else:
                                 # If department name not found, try to use the value directly
                                 # (it might already be an ID)
                                 try:
                                     # Check if it's a valid number
                                     department_id = int(department_name)
-                                    formatted_value = str(department_id)
+                                    formatted_value = self._bind_value(params, col, department_id)
                                     logger.info(f"Using department ID directly: {department_id}")
                                 except ValueError:
                                     # Not a valid ID, use NULL or default value
                                     formatted_value = "NULL"
                                     logger.warning(f"Department name '{department_name}' not found, using NULL")
                         else:
-                            # Regular value formatting
-                            formatted_value = self._format_value(user_inputs[col], col_type)
+                            # Regular values are converted to the column's type and bound
+                            formatted_value = self._bind_value(params, col, self._convert_value(user_inputs[col], col_type),
+                                                               col_type)
 
                         # Update or append the value
                         if i < len(values):
@@ -678,80 +765,88 @@ class InsertQueryHandler:
             values_str = ", ".join(values)
             query = f"INSERT INTO {table_name} ({columns_str}) VALUES ({values_str})"
 
-            logger.info(f"Generated complete query: {query}")
-            return query
+            logger.info(f"Generated complete query: {query} with parameters {params}")
+            return query, params
 
         except Exception as e:
             logger.error(f"Error generating complete query: {str(e)}")
-            return analysis.get("query", "")
+            return analysis.get("query", ""), {}
+
+    @staticmethod
+    def _bind_value(params: Dict[str, Any], column: str, value: Any, col_type: str = "unknown") -> str:
+        """
+        Add a value to params under a name derived from its column and return its placeholder.
 
-    def _format_value(self, value: str, col_type: str) -> str:
+        Text that didn't parse as the column's (non-text) type is bound as text
+        and cast by the database, which accepts more input formats ("Jan 5 2024",
+        "1,000") than the driver does for a typed parameter.
         """
-        Format a value based on its column type.
+        name = re.sub(r"\W", "_", column)
+        while name in params:
+            name += "_"
+        params[name] = value
+        base_type = _base_type(col_type)
+        if isinstance(value, str) and base_type not in _TEXT_TYPES and _TYPE_NAME.fullmatch(col_type.strip()):
+            return f"CAST(CAST(:{name} AS TEXT) AS {col_type.strip()})"
+        return f":{name}"
+
+    def _convert_value(self, value: str, col_type: str) -> Any:
+        """
+        Convert a user-provided value to a Python value for its column type.
 
         Args:
-            value: The value to format
+            value: The value as the user typed it
             col_type: The SQL type of the column
 
         Returns:
-            Formatted value for SQL
+            None for NULL; a date, datetime or time, number or bool when the
+            value parses as the column's type; otherwise the text itself
         """
         # Handle NULL values
-        if not value or value.upper() == "NULL":
-            return "NULL"
+        if not value or value.strip().upper() == "NULL":
+            return None
 
-        # Trim whitespace
+        # Trim whitespace, and quotes typed around the value
         value = value.strip()
-
-        # Log the formatting
-        logger.info(f"Formatting value: '{value}' for column type: {col_type}")
-
-        # Handle date and timestamp types
-        if any(date_type in col_type.lower() for date_type in ["date", "time", "timestamp"]):
-            # If already quoted, return as is
-            if value.startswith("'") and value.endswith("'"):
-                return value
-
-            # Try to parse as date/time
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in ("'", '"'):
+            value = value[1:-1]
+        base_type = _base_type(col_type)
+
+        # Log the conversion
+        logger.info(f"Converting value: '{value}' for column type: {base_type}")
+
+        # Handle date and timestamp types (with time zone ones stay text, so the session time zone applies)
+        if base_type in _DATE_TYPES | _TIMESTAMP_TYPES | _TIME_TYPES:
+            # MM/DD/YYYY is converted to ISO format
+            us_date = re.fullmatch(r'(\d{2})/(\d{2})/(\d{4})', value)
+            if us_date:
+                value = f"{us_date.group(3)}-{us_date.group(1)}-{us_date.group(2)}"
             try:
-                # Simple validation - check if it has expected date/time format
-                if re.match(r'\d{4}-\d{2}-\d{2}', value):  # YYYY-MM-DD format
-                    return f"'{value}'"
-                elif re.match(r'\d{2}/\d{2}/\d{4}', value):  # MM/DD/YYYY format
-                    # Convert to ISO format
-                    parts = value.split('/')
-                    iso_date = f"{parts[2]}-{parts[0]}-{parts[1]}"
-                    return f"'{iso_date}'"
-                else:
-                    # If it doesn't match expected formats, quote it anyway
-                    return f"'{value}'"
-            except Exception:
-                # If parsing fails, just quote the value
-                return f"'{value}'"
+                if base_type in _TIMESTAMP_TYPES:
+                    return datetime.fromisoformat(value)
+                if base_type in _DATE_TYPES:
+                    return date.fromisoformat(value)
+                return time.fromisoformat(value)
+            except ValueError:
+                # Bound as text and cast by the database
+                return value
 
         # Handle numeric types
-        if any(num_type in col_type.lower() for num_type in ["int", "float", "numeric", "decimal", "double", "real"]):
-            try:
-                # Check if it's a valid number
-                float(value)
-                return value
-            except ValueError:
-                # Not a valid number, treat as string
-                return f"'{value}'"
+        try:
+            if base_type in _INTEGER_TYPES:
+                return int(value)
+            if base_type in _FLOAT_TYPES:
+                return float(value)
+            if base_type in _NUMERIC_TYPES:
+                return Decimal(value)
+        except (ValueError, InvalidOperation):
+            return value
 
         # Handle boolean
-        if "boolean" in col_type.lower() or "bool" in col_type.lower():
+        if base_type in _BOOLEAN_TYPES:
             if value.lower() in ["true", "t", "yes", "y", "1"]:
-                return "TRUE"
+                return True
             elif value.lower() in ["false", "f", "no", "n", "0"]:
-                return "FALSE"
-            else:
-                return f"'{value}'"
-
-        # Handle already quoted values
-        if (value.startswith("'") and value.endswith("'")) or (value.startswith('"') and value.endswith('"')):
-            return value
+                return False
 
-        # Default to string with proper escaping
-        escaped_value = value.replace("'", "''")
-        return f"'{escaped_value}'"
+        return value
@@ -0,0 +1,241 @@
+import re
+import json
+import math
+import random
+import asyncio
+import logging
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple, Any, Protocol, runtime_checkable
+import httpx
+from .config import (LLM_BACKEND, LLM_STUB_RESPONSES_PATH, LLM_STUB_TTFT_MS, LLM_STUB_TOKEN_MS, LLM_STUB_SEED)
+from .ollama_pool import OllamaPool
+
+logger = logging.getLogger(__name__)
+
+@runtime_checkable
+class LLMBackend(Protocol):
+    """
+    Something that turns an Ollama-style chat request into a completion.
+
+    Requests and chunks use the Ollama /api/chat format: chunks carry
+    ``{"message": {"content": ...}, "done": ...}`` and the final chunk carries
+    the prompt/decode counts and durations.
+    """
+
+    def start(self) -> None:
+        """Start background work (needs a running event loop)."""
+
+    async def close(self) -> None:
+        """Release resources."""
+
+    async def generate(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Return the whole completion as a single final chunk."""
+
+    def stream(self, request: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """Yield completion chunks as they are produced. Closing the iterator aborts the generation."""
+
+    async def health(self) -> bool:
+        """True if the backend can take requests."""
+
+    def stats(self) -> Any:
+        """Backend-specific counters for /api/stats."""
+
+
+class OllamaLLMBackend:
+    """Sends requests to the pool of Ollama hosts (see OllamaPool)."""
+
+    def __init__(self, http_client: httpx.AsyncClient, pool: Optional[OllamaPool] = None):
+        self.http_client = http_client
+        self.pool = pool or OllamaPool(http_client)
+
+    def start(self) -> None:
+        self.pool.start()
+
+    async def close(self) -> None:
+        await self.pool.close()
+
+    async def generate(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        async with self.pool.lease() as backend:
+            response = await self.http_client.post(backend.url, json={**request, "stream": False})
+            response.raise_for_status()
+            return response.json()
+
+    async def stream(self, request: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream from the least busy backend in the pool.
+
+        If a backend fails before any text was produced, the request is retried
+        once on each of the other backends.
+        """
+        tried = set()
+        while True:
+            produced = False
+            try:
+                async with self.pool.lease(exclude=tried) as backend:
+                    tried.add(backend.url)
+                    logger.info(f" Sending streaming request to {backend.url}")
+                    async with self.http_client.stream("POST", backend.url, json=request) as response:
+                        response.raise_for_status()
+                        async for line in response.aiter_lines():
+                            if not line:
+                                continue
+                            chunk = json.loads(line)
+                            if chunk.get("error"):
+                                raise ValueError(chunk["error"])
+                            if chunk.get("message", {}).get("content"):
+                                produced = True
+                            yield chunk
+                            if chunk.get("done"):
+                                break
+                return
+            except httpx.HTTPError as e:
+                # Text already sent can't be taken back, and every backend may have been tried
+                if produced or len(tried) >= len(self.pool):
+                    raise
+                logger.warning(f" Ollama backend failed ({str(e) or type(e).__name__}), retrying on another backend")
+
+    async def health(self) -> bool:
+        # Read-only: ejecting and reinstating backends is left to the pool's own probes
+        problems = await asyncio.gather(*(self.pool.check(backend) for backend in self.pool.backends))
+        return any(problem is None for problem in problems)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return self.pool.stats()
+
+
+# Canned answers used by the stub when no LLM_STUB_RESPONSES_PATH file is given (first match wins)
+_DEFAULT_STUB_RESPONSES = [
+    (r"\b(how many|count|number of)\b.*\bdepartments?\b", "SELECT COUNT(*) AS department_count FROM department;"),
+    (r"\b(how many|count|number of)\b", "SELECT COUNT(*) AS employee_count FROM employee;"),
+    (r"\bdepartments?\b", "SELECT * FROM department;"),
+    (r"\b(add|insert|create)\b.*\bemployee\b",
+     "INSERT INTO employee (employee_name, employee_hire_date, department_identifier) VALUES (?, ?, ?);"),
+    (r".*", "SELECT * FROM employee LIMIT 10;")
+]
+
+def parse_latency_spec(spec: str) -> Callable[[random.Random], float]:
+    """
+    Parse a synthetic latency distribution, in milliseconds.
+
+    Formats: ``fixed:MS``, ``uniform:LOW,HIGH``, ``normal:MEAN,STDDEV`` and
+    ``lognormal:MEDIAN,SIGMA`` (a long right tail, like real generation times).
+
+    Returns:
+        Function drawing a non-negative latency from a random generator
+    """
+    kind, _, args = spec.strip().partition(":")
+    try:
+        values = [float(v) for v in args.split(",") if v.strip()]
+        if kind == "fixed" and len(values) == 1:
+            return lambda rng: max(0.0, values[0])
+        if kind == "uniform" and len(values) == 2:
+            return lambda rng: rng.uniform(values[0], values[1])
+        if kind == "normal" and len(values) == 2:
+            return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+        if kind == "lognormal" and len(values) == 2 and values[0] > 0:
+            return lambda rng: rng.lognormvariate(math.log(values[0]), values[1])
+    except ValueError:
+        pass
+    raise ValueError(f"Invalid latency spec '{spec}' (use fixed:MS, uniform:LOW,HIGH, normal:MEAN,STD "
+                     f"or lognormal:MEDIAN,SIGMA)")
+
+
+class StubLLMBackend:
+    """
+    Deterministic in-process stand-in for Ollama, for load tests and benchmarks.
+
+    The question (the text after "Question:" in the last user message, or the
+    whole message) is matched against regex -> SQL pairs, loaded from the JSON
+    file at LLM_STUB_RESPONSES_PATH (an object of regex -> SQL) or taken from a
+    small built-in set. The answer is streamed in small pieces after a synthetic
+    time to first token, with a synthetic delay per piece; both are drawn from
+    seeded distributions so runs are reproducible.
+    """
+
+    def __init__(self, responses_path: str = LLM_STUB_RESPONSES_PATH, ttft_ms: str = LLM_STUB_TTFT_MS,
+                 token_ms: str = LLM_STUB_TOKEN_MS, seed: int = LLM_STUB_SEED):
+        responses = _DEFAULT_STUB_RESPONSES
+        if responses_path:
+            with open(responses_path, "r", encoding="utf-8") as f:
+                responses = list(json.load(f).items())
+        self.responses: List[Tuple[re.Pattern, str]] = [(re.compile(p, re.IGNORECASE), sql) for p, sql in responses]
+        self._ttft_ms = parse_latency_spec(ttft_ms)
+        self._token_ms = parse_latency_spec(token_ms)
+        self._rng = random.Random(seed)
+        self.requests = 0
+        logger.info(f" Initialized StubLLMBackend ({len(self.responses)} canned responses, ttft {ttft_ms}, "
+                    f"per token {token_ms})")
+
+    def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    @staticmethod
+    def _question(request: Dict[str, Any]) -> str:
+        content = request["messages"][-1]["content"]
+        return content.rsplit("Question:", 1)[-1].strip()
+
+    def _answer(self, question: str) -> str:
+        for pattern, sql in self.responses:
+            if pattern.search(question):
+                return f"```sql\n{sql}\n```\n"
+        return "```sql\nSELECT 1;\n```\n"
+
+    @staticmethod
+    def _pieces(text: str) -> List[str]:
+        """Split the answer into token-sized pieces (about four characters each)."""
+        return [text[i:i + 4] for i in range(0, len(text), 4)]
+
+    async def generate(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        content = []
+        final = {}
+        async for chunk in self.stream(request):
+            content.append(chunk["message"]["content"])
+            final = chunk
+        return {**final, "message": {"role": "assistant", "content": "".join(content)}}
+
+    async def stream(self, request: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        self.requests += 1
+        answer = self._answer(self._question(request))
+        # Like Ollama, end the output before the first stop sequence (which is not emitted)
+        for stop in request.get("options", {}).get("stop", []):
+            if stop in answer:
+                answer = answer[:answer.index(stop)]
+        pieces = self._pieces(answer)
+        prompt_chars = sum(len(m["content"]) for m in request["messages"])
+
+        ttft_ms = self._ttft_ms(self._rng)
+        await asyncio.sleep(ttft_ms / 1000)
+        decode_ms = 0.0
+        for i, piece in enumerate(pieces):
+            if i:
+                delay = self._token_ms(self._rng)
+                decode_ms += delay
+                await asyncio.sleep(delay / 1000)
+            yield {"message": {"role": "assistant", "content": piece}, "done": False}
+
+        yield {
+            "message": {"role": "assistant", "content": ""},
+            "done": True,
+            "prompt_eval_count": prompt_chars // 4 + 1,
+            "prompt_eval_duration": int(ttft_ms * 1e6),
+            "load_duration": 0,
+            "eval_count": len(pieces),
+            "eval_duration": int(decode_ms * 1e6)
+        }
+
+    async def health(self) -> bool:
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "stub", "requests": self.requests}
+
+
+def create_llm_backend(http_client: httpx.AsyncClient, kind: str = LLM_BACKEND) -> LLMBackend:
+    """Build the backend selected by LLM_BACKEND ("ollama" or "stub")."""
+    if kind == "stub":
+        return StubLLMBackend()
+    if kind != "ollama":
+        raise ValueError(f"Unknown LLM_BACKEND '{kind}' (expected 'ollama' or 'stub')")
+    return OllamaLLMBackend(http_client)
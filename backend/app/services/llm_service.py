@@ -1,40 +1,91 @@
-import requests
-import json
+import httpx
+import asyncio
 import logging
-import re
-from typing import List, Dict, Optional, Tuple, Any
+import time
+from contextlib import aclosing
+from typing import AsyncIterator, List, Dict, Optional, Tuple, Any
 from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from .config import (OLLAMA_MODEL, OLLAMA_TIMEOUT, OLLAMA_MAX_CONNECTIONS, OLLAMA_NUM_PREDICT,
+                     OLLAMA_KEEP_ALIVE, STREAM_ROW_CHUNK_SIZE, SIMILARITY_ENABLED, SIMILARITY_THRESHOLD,
+                     SCHEMA_PRUNING_ENABLED, HEDGE_CANDIDATES, HEDGE_TEMPERATURES, TEMPLATES_ENABLED,
+                     COST_GATE_ENABLED)
+from .concurrency import SingleFlight, AdmissionController, OverloadedError
 from .db_service import DatabaseService
+from .db_engine import dispose_engines, pool_stats
 from .insert_handler import InsertQueryHandler
+from .conversation_manager import ConversationManager, ConversationState
+from .sql_stream_parser import SqlFenceParser
+from .sql_cache import SqlAnswerCache, normalize_question, schema_fingerprint
+from .similarity_index import QuestionSimilarityIndex
+from .sql_context_manager import SchemaContextManager, estimate_tokens
+from .metrics import RollingStats
+from .llm_backends import create_llm_backend
+from .model_router import ModelRouter, SMALL_TIER, LARGE_TIER
+from .template_router import TemplateRouter
+from .result_pager import ResultPager
+from .cost_gate import CostGate
 
 logger = logging.getLogger(__name__)
 
 class LLMService:
     def __init__(self):
-        self.ollama_url = "http://localhost:11434/api/generate"
-        self.model = "SqlGenerator"
+        self.model = OLLAMA_MODEL
+        # Pooled async client so generations in flight don't block the event loop
+        self.http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(OLLAMA_TIMEOUT, connect=10.0),
+            limits=httpx.Limits(max_connections=OLLAMA_MAX_CONNECTIONS, max_keepalive_connections=OLLAMA_MAX_CONNECTIONS)
+        )
+        # Generations go to the configured backend (the Ollama host pool, or a stub for load tests)
+        self.llm_backend = create_llm_backend(self.http_client)
         self.db_service = DatabaseService()
         self.insert_handler = InsertQueryHandler()
+        # Department name -> id lookups for INSERTs and templates are reloaded after department changes
+        self.db_service.departments.add_listener(lambda: self.insert_handler.invalidate_reference_data("department"))
         logger.info(f" Initialized LLM Service with model: {self.model}")
-        self.last_query_context = None
-        self.pending_insert_query = None
+        # Per-session state (pending INSERT, last results) lives here, not on the service
+        self.conversations = ConversationManager()
 
         # Fetch database schema
         self.db_schema = self.db_service.get_database_schema()
 
+        # Cache of generated SQL for repeat questions, scoped to this schema
+        self.schema_fingerprint = schema_fingerprint(self.db_schema)
+        self.sql_cache = SqlAnswerCache()
+
+        # Paraphrases of answered questions reuse their SQL; seeded from the (possibly persisted) cache
+        self.similarity_index = QuestionSimilarityIndex() if SIMILARITY_ENABLED else None
+        self.similar_question_hits = 0
+        if self.similarity_index is not None:
+            for question, entry in self.sql_cache.entries_for(self.schema_fingerprint):
+                self.similarity_index.add(question, entry)
+
         # Print a message that the schema is loaded
         print("\n" + "="*80)
         print("DATABASE SCHEMA LOADED FOR CONTEXT")
         print("="*80)
 
         logger.info(" Loaded database schema for context")
-          # Update system prompt with schema
-        self.system_prompt = f"""
-Database schema:
 
-{self.db_schema}
+        # Prompts only carry the tables relevant to each question
+        self.schema_context = None
+        if SCHEMA_PRUNING_ENABLED and self.db_service.schema_tables:
+            self.schema_context = SchemaContextManager(self.db_service.schema_tables)
+
+        # Simple questions are answered by a smaller, faster model when one is configured
+        self.model_router = ModelRouter(self.schema_context)
+
+        # Generated SELECTs are capped at a page of rows; the rest is fetched by key with a page token
+        self.result_pager = ResultPager(self.db_service.schema_tables)
+        # Generated SELECTs the planner expects to be too expensive are shrunk to a smaller page or refused
+        self.cost_gate = CostGate(self.db_service, self.result_pager) if COST_GATE_ENABLED else None
 
-Instructions:
+        # Common question shapes skip the model entirely
+        self.template_router = None
+        if TEMPLATES_ENABLED and self.db_service.schema_tables:
+            self.template_router = TemplateRouter(self.db_service.schema_tables, self.insert_handler)
+
+        self.prompt_instructions = """Instructions:
 1. Generate only SQL query
 2. Query must be wrapped in ```sql ``` tags
 3. No explanations or other text
@@ -46,24 +97,43 @@ Instructions:
    - ALWAYS use '?' for department_identifier in employee table (user will provide department name)
    - NEVER provide actual department_identifier values, always use '?' for these fields"""
 
+        # Fixed system message: identical bytes on every request so Ollama reuses the evaluated prefix
+        self.system_prompt = f"Database schema:\n\n{self.db_schema}\n\n{self.prompt_instructions}"
+
+        # Identical in-flight questions share one generation; generations are bounded by the admission queue
+        self.single_flight = SingleFlight()
+        self.admission = AdmissionController()
+        # Hedged generation counters (only used when HEDGE_CANDIDATES > 1)
+        self.hedge_stats = {"requests": 0, "invalid_candidates": 0, "failed_candidates": 0, "no_valid_candidate": 0}
+
+        # Per-request timings reported by Ollama, to track prefix reuse
+        self.generation_stats = {
+            "time_to_first_token_ms": RollingStats(),
+            "prompt_eval_tokens": RollingStats(),
+            "prompt_eval_ms": RollingStats(),
+            "load_ms": RollingStats(),
+            "decode_tokens": RollingStats(),
+            "decode_ms": RollingStats()
+        }
+
+    async def start(self) -> None:
+        """Start background work that needs the event loop (Ollama health probing, reference data refresh)."""
+        self.llm_backend.start()
+        self.db_service.start()
+
+    async def close(self) -> None:
+        """Close the HTTP client and database connection pools."""
+        self.sql_cache.save()
+        await self.llm_backend.close()
+        await self.http_client.aclose()
+        await self.db_service.close()
+        await dispose_engines()
+
     def _extract_sql_and_explanation(self, response: str) -> Tuple[str, str]:
         """Extract SQL query and explanation from the response."""
-        lines = response.split('\n')
-        sql_query = ""
-        explanation = []
-        in_code_block = False
-
-        for line in lines:
-            if '```' in line:
-                in_code_block = not in_code_block
-                continue
-
-            if in_code_block:
-                sql_query += line + "\n"
-            else:
-                explanation.append(line)
-
-        return sql_query.strip(), "\n".join(explanation).strip()
+        parser = SqlFenceParser()
+        parser.feed(response)
+        return parser.finish()
 
     def format_response(self, response: str, query_results: Optional[Dict] = None) -> Dict[str, Any]:
         """Format the response with SQL query and results as JSON."""
@@ -87,14 +157,14 @@ Instructions:
 
         return result
 
-    def _get_available_departments(self) -> List[str]:
+    async def _get_available_departments(self) -> List[str]:
         """Get a list of available department names from the database."""
         try:
             # Query the database for department names
             departments = []
-            with self.db_service.engine.connect() as connection:
+            async with self.db_service.async_engine.connect() as connection:
                 query = "SELECT department_name FROM department ORDER BY department_name"
-                result = connection.execute(text(query))
+                result = await connection.execute(text(query))
                 departments = [row[0] for row in result]
 
             return departments
@@ -102,7 +172,7 @@ Instructions:
             logger.error(f"Error getting department list: {str(e)}")
             return []
 
-    def is_follow_up_question(self, message: str) -> bool:
+    def is_follow_up_question(self, message: str, conversation: ConversationState) -> bool:
         """Check if the message is a follow-up question about the last query."""
         follow_up_triggers = [
             "explain", "clarify", "what does this mean",
@@ -111,15 +181,16 @@ Instructions:
             "how does this work", "tell me more"
         ]
         message = message.lower().strip()
-        return any(trigger in message for trigger in follow_up_triggers) and self.last_query_context is not None
+        return any(trigger in message for trigger in follow_up_triggers) and conversation.last_query_context is not None
 
-    def is_insert_value_input(self, _: str) -> bool:
+    def is_insert_value_input(self, _: str, conversation: ConversationState) -> bool:
         """Check if the message is providing a value for a pending INSERT query."""
-        return self.pending_insert_query is not None
+        return conversation.pending_insert_query is not None
 
-    def process_insert_value_input(self, user_message: str) -> Dict[str, Any]:
+    async def process_insert_value_input(self, user_message: str, conversation: ConversationState) -> Dict[str, Any]:
         """Process user input for a pending INSERT query with missing values."""
-        if not self.pending_insert_query:
+        pending_insert_query = conversation.pending_insert_query
+        if not pending_insert_query:
             return {
                 "success": False,
                 "error": "No pending INSERT query to process",
@@ -127,7 +198,7 @@ Instructions:
             }
 
         # Get the current field being requested
-        current_field = self.pending_insert_query.get("current_field")
+        current_field = pending_insert_query.get("current_field")
         if not current_field:
             return {
                 "success": False,
@@ -137,19 +208,19 @@ Instructions:
 
         # Add the user input to the collected values
         field_name = current_field["name"]
-        self.pending_insert_query["collected_values"][field_name] = user_message
+        pending_insert_query["collected_values"][field_name] = user_message
 
         # Update the list of fields that still need values
         remaining_fields = []
-        for field in self.pending_insert_query.get("remaining_fields", []):
+        for field in pending_insert_query.get("remaining_fields", []):
             if field["name"] != field_name:
                 remaining_fields.append(field)
 
         # Check if we have more fields to collect
         if remaining_fields:
             # Update the pending query with the next field
-            self.pending_insert_query["remaining_fields"] = remaining_fields
-            self.pending_insert_query["current_field"] = remaining_fields[0]
+            pending_insert_query["remaining_fields"] = remaining_fields
+            pending_insert_query["current_field"] = remaining_fields[0]
 
             # Return a response asking for the next field
             next_field = remaining_fields[0]
@@ -161,7 +232,7 @@ Instructions:
                 field_message = f"Please provide the department name"
 
                 # Get available departments for the user to choose from
-                departments = self._get_available_departments()
+                departments = await self._get_available_departments()
                 if departments:
                     field_message += f". Available departments: {', '.join(departments)}"
             else:
@@ -177,30 +248,38 @@ Instructions:
             }
         else:
             # All fields collected, generate the complete query
-            analysis = self.pending_insert_query["analysis"]
-            collected_values = self.pending_insert_query["collected_values"]
+            analysis = pending_insert_query["analysis"]
+            collected_values = pending_insert_query["collected_values"]
 
             # Generate the complete INSERT query
-            complete_query = self.insert_handler.generate_complete_query(analysis, collected_values)
+            complete_query, params = await self.insert_handler.generate_complete_query(analysis, collected_values)
 
             # Reset the pending query
-            self.pending_insert_query = None
+            conversation.pending_insert_query = None
 
             # Generate a new response with the complete query
-            return self.generate_sql_response(complete_query, f"INSERT query completed with all required values.")
+            return await self.generate_sql_response(complete_query, f"INSERT query completed with all required values.", conversation,
+                                                    params=params)
 
-    def generate_sql_response(self, sql_query: str, explanation: str = "") -> Dict[str, Any]:
-        """Generate a response for a SQL query."""
+    async def generate_sql_response(self, sql_query: str, explanation: str = "",
+                                    conversation: Optional[ConversationState] = None,
+                                    params: Optional[Dict[str, Any]] = None, check_cost: bool = True) -> Dict[str, Any]:
+        """Generate a response for a SQL query (with optional bind parameters and cost check for SELECTs)."""
         try:
-            # Execute the SQL query
-            query_results = self.db_service.execute_query(sql_query)
+            if self._is_read_query(sql_query):
+                # SELECTs return the first page of rows, plus a token for the next one
+                formatted_response = await self._execute_page(sql_query, explanation, params, check_cost=check_cost)
+            else:
+                # Execute the SQL query
+                query_results = await self.db_service.execute_query(sql_query, params)
 
-            # Format the response
-            raw_response = f"{explanation}\n\n```sql\n{sql_query}\n```"
-            formatted_response = self.format_response(raw_response, query_results)
+                # Format the response
+                raw_response = f"{explanation}\n\n```sql\n{sql_query}\n```"
+                formatted_response = self.format_response(raw_response, query_results)
 
             # Store context for follow-up questions
-            self.last_query_context = formatted_response
+            if conversation is not None:
+                conversation.last_query_context = formatted_response
 
             return formatted_response
 
@@ -214,192 +293,514 @@ Instructions:
                 "data": None
             }
 
-    def generate_response(self, user_message: str) -> Dict[str, Any]:
+    async def _execute_page(self, sql_query: str, explanation: str = "", params: Optional[Dict[str, Any]] = None,
+                            after: Any = None, check_cost: bool = False) -> Dict[str, Any]:
+        """
+        Run one page of a SELECT and format it, adding next_page_token/truncated to the response.
+
+        With check_cost, the page goes through the cost gate first and the plan
+        summary is returned as query_plan.
+        """
+        plan = self.result_pager.plan(sql_query, params, after)
+        plan_summary = None
+        if check_cost and self.cost_gate is not None:
+            gate = await self.cost_gate.check(plan, sql_query, params, after)
+            plan, plan_summary = gate["plan"], gate["summary"]
+            if gate["error"]:
+                return {"success": False, "error": gate["error"], "sql_query": sql_query, "explanation": explanation,
+                        "data": None, "query_plan": plan_summary}
+        query_results = await self.db_service.execute_query(plan["sql"], plan["params"])
+
+        next_page_token, truncated = None, False
+        if query_results["success"]:
+            rows, next_page_token, truncated = self.result_pager.finish(query_results["results"], plan, sql_query, params)
+            query_results = {**query_results, "results": rows, "row_count": len(rows)}
+
+        formatted_response = self.format_response(f"{explanation}\n\n```sql\n{sql_query}\n```", query_results)
+        if formatted_response.get("data") is not None:
+            formatted_response["data"]["next_page_token"] = next_page_token
+            formatted_response["truncated"] = truncated
+            if next_page_token or truncated:
+                formatted_response["message"] = f"Showing the first {len(rows)} results"
+        if plan_summary is not None:
+            formatted_response["query_plan"] = plan_summary
+        return formatted_response
+
+    async def fetch_page(self, page_token: str) -> Dict[str, Any]:
+        """Return the next page of a SELECT from a continuation token."""
+        try:
+            sql_query, params, after = self.result_pager.read_token(page_token)
+        except (ValueError, KeyError) as e:
+            return {"success": False, "error": str(e), "sql_query": "", "explanation": "", "data": None}
+
+        response_data = await self._execute_page(sql_query, "", params, after, check_cost=True)
+        if response_data.get("data") is not None and response_data["success"]:
+            response_data["message"] = f"Showing the next {len(response_data['data']['rows'])} results"
+        return response_data
+
+    def _build_messages(self, user_message: str) -> List[Dict[str, str]]:
+        """
+        Build the chat messages for a user message.
+
+        The system message never changes, so the model server can keep its
+        evaluated prefix cached across requests. With schema pruning on, the
+        per-question schema goes into the user message after that fixed prefix.
+        """
+        if self.schema_context is None:
+            return [
+                {"role": "system", "content": self.system_prompt},
+                {"role": "user", "content": user_message}
+            ]
+
+        schema = self.schema_context.build_schema_context(user_message)
+        logger.info(f" Prompt schema: ~{estimate_tokens(schema)} of ~{estimate_tokens(self.db_schema)} tokens")
+        return [
+            {"role": "system", "content": self.prompt_instructions},
+            {"role": "user", "content": f"Database schema:\n\n{schema}\n\nQuestion: {user_message}"}
+        ]
+
+    def _build_request(self, user_message: str, stream: bool, model: Optional[str] = None,
+                       options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Build the Ollama chat request for a user message, with optional extra sampling options."""
+        return {
+            "model": model or self.model,
+            "messages": self._build_messages(user_message),
+            "stream": stream,
+            # Keep the model (and its prompt cache) loaded between requests
+            "keep_alive": OLLAMA_KEEP_ALIVE,
+            "options": {
+                # Cap decode length; streamed generations are also stopped by the fence parser once the SQL
+                # block closes (a stop sequence can't tell a bare opening fence from the closing one)
+                "num_predict": OLLAMA_NUM_PREDICT,
+                **(options or {})
+            }
+        }
+
+    def _record_generation_stats(self, final_chunk: Dict[str, Any], time_to_first_token: Optional[float]) -> None:
+        """Record the timings Ollama reports in the final chunk of a generation (durations are in ns)."""
+        prompt_eval_tokens = final_chunk.get("prompt_eval_count", 0)
+        prompt_eval_ms = final_chunk.get("prompt_eval_duration", 0) / 1e6
+        load_ms = final_chunk.get("load_duration", 0) / 1e6
+        decode_tokens = final_chunk.get("eval_count", 0)
+        decode_ms = final_chunk.get("eval_duration", 0) / 1e6
+
+        stats = self.generation_stats
+        if time_to_first_token is not None:
+            stats["time_to_first_token_ms"].record(time_to_first_token * 1000)
+        stats["prompt_eval_tokens"].record(prompt_eval_tokens)
+        stats["prompt_eval_ms"].record(prompt_eval_ms)
+        stats["load_ms"].record(load_ms)
+        stats["decode_tokens"].record(decode_tokens)
+        stats["decode_ms"].record(decode_ms)
+
+        logger.info(f" Prompt eval: {prompt_eval_tokens} tokens in {prompt_eval_ms:.0f} ms (load {load_ms:.0f} ms), "
+                    f"decode: {decode_tokens} tokens in {decode_ms:.0f} ms")
+
+    async def _generate_sql(self, user_message: str, flight_key: str) -> Tuple[str, str]:
+        """
+        Generate SQL for a user message.
+
+        Concurrent calls with the same flight key (the normalized question) share
+        a single generation. The generation is streamed through the fence parser
+        and abandoned as soon as the SQL block closes, which also stops decoding
+        on the Ollama side.
+
+        Returns:
+            Tuple of (sql_query, explanation)
+        """
+        return await self.single_flight.do(flight_key, lambda: self._run_generation(user_message))
+
+    async def _run_generation(self, user_message: str) -> Tuple[str, str]:
+        """Generate SQL on the routed model tier, escalating to the large model if the result is unusable."""
+        tier = self.model_router.choose_tier(user_message)
+        while True:
+            if HEDGE_CANDIDATES > 1:
+                sql_query, explanation, error = await self._generate_hedged(user_message, tier)
+                reason = error if tier == SMALL_TIER else None
+            else:
+                sql_query, explanation = await self._generate_candidate(user_message, tier)
+                reason = await self._escalation_reason(tier, sql_query)
+            if reason is None:
+                return sql_query, explanation
+            tier = self._escalate(reason)
+
+    async def _generate_candidate(self, user_message: str, tier: str,
+                                  options: Optional[Dict[str, Any]] = None) -> Tuple[str, str]:
+        """Run one generation on a model tier and return its (sql_query, explanation)."""
+        parser = SqlFenceParser()
+        async with aclosing(self._stream_tier(user_message, tier, parser, options)) as tokens:
+            async for _ in tokens:
+                pass
+        return parser.finish()
+
+    @staticmethod
+    def _hedge_options(index: int) -> Optional[Dict[str, Any]]:
+        """Sampling options for hedge candidate `index`; the first candidate keeps the model defaults."""
+        if index == 0 or not HEDGE_TEMPERATURES:
+            return None
+        return {"seed": index, "temperature": HEDGE_TEMPERATURES[(index - 1) % len(HEDGE_TEMPERATURES)]}
+
+    async def _generate_hedged(self, user_message: str, tier: str) -> Tuple[str, str, Optional[str]]:
+        """
+        Run HEDGE_CANDIDATES generations concurrently and keep the first valid one.
+
+        Candidates differ in seed and temperature, and the backend pool spreads
+        them over the model hosts. Each is checked with EXPLAIN as it finishes;
+        the first that passes wins and the others are cancelled, which aborts
+        their generations.
+
+        Returns:
+            Tuple of (sql_query, explanation, error), where error is None for a
+            valid candidate or the validation error of the first candidate if
+            none was valid
+        """
+        self.hedge_stats["requests"] += 1
+        tasks = [asyncio.create_task(self._generate_candidate(user_message, tier, self._hedge_options(i)))
+                 for i in range(HEDGE_CANDIDATES)]
+        fallback = None
+        last_error: Optional[BaseException] = None
+        try:
+            for finished in asyncio.as_completed(tasks):
+                try:
+                    sql_query, explanation = await finished
+                except (httpx.HTTPError, OverloadedError, ValueError) as e:
+                    self.hedge_stats["failed_candidates"] += 1
+                    last_error = e
+                    continue
+
+                error = await self._validation_error(sql_query)
+                if error is None:
+                    return sql_query, explanation, None
+                self.hedge_stats["invalid_candidates"] += 1
+                fallback = fallback or (sql_query, explanation, error)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        self.hedge_stats["no_valid_candidate"] += 1
+        if fallback is not None:
+            return fallback
+        raise last_error
+
+    async def _stream_tier(self, user_message: str, tier: str, parser: SqlFenceParser,
+                           options: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """Stream one generation on a model tier through the fence parser, holding an admission slot."""
+        start_time = time.perf_counter()
+        async with self.admission.slot():
+            async with aclosing(self._stream_completion(user_message, self.model_router.model_for(tier),
+                                                        options)) as tokens:
+                async for token in tokens:
+                    yield token
+                    if parser.feed(token):
+                        break
+
+        self.model_router.record(tier, (time.perf_counter() - start_time) * 1000)
+
+    async def _escalation_reason(self, tier: str, sql_query: str) -> Optional[str]:
+        """Why SQL from the small model should be regenerated by the large one (None if it can be used)."""
+        if tier != SMALL_TIER:
+            return None
+        return await self._validation_error(sql_query)
+
+    async def _validation_error(self, sql_query: str) -> Optional[str]:
+        """Check generated SQL against the database; returns the problem, or None if it can be used."""
+        if not sql_query:
+            return "no SQL generated"
+        # Writes may carry '?' placeholders the user fills in later, so they can't be planned yet
+        if sql_query.strip().upper().startswith(("INSERT", "UPDATE", "DELETE")):
+            return None
+        return await self.db_service.validate_query(sql_query)
+
+    def _escalate(self, reason: str) -> str:
+        logger.info(f" Small model SQL rejected ({reason}), escalating to the large model")
+        self.model_router.record_escalation()
+        return LARGE_TIER
+
+    async def _stream_completion(self, user_message: str, model: Optional[str] = None,
+                                 options: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """Yield generated text from the LLM backend as it arrives. Closing the iterator aborts the generation."""
+        request_data = self._build_request(user_message, stream=True, model=model, options=options)
+        logger.info(f" Sending streaming request ({len(user_message)} chars)")
+
+        start_time = time.perf_counter()
+        time_to_first_token = None
+        async with aclosing(self.llm_backend.stream(request_data)) as chunks:
+            async for chunk in chunks:
+                token = chunk.get("message", {}).get("content", "")
+                if token:
+                    if time_to_first_token is None:
+                        time_to_first_token = time.perf_counter() - start_time
+                    yield token
+                if chunk.get("done"):
+                    self._record_generation_stats(chunk, time_to_first_token)
+                    break
+
+    async def _handle_generated_sql(self, user_message: str, sql_query: str, explanation: str,
+                                    conversation: ConversationState) -> Dict[str, Any]:
+        """Start interactive value collection for INSERT queries that need it, otherwise execute the SQL."""
+        # Check if this is an INSERT query that might need additional values
+        if sql_query.strip().upper().startswith("INSERT"):
+            # Analyze the INSERT query
+            analysis = await self.insert_handler.analyze_insert_query(sql_query)
+
+            # Force interactive mode for certain user queries
+            force_interactive = False
+            if any(phrase in user_message.lower() for phrase in ["add new", "create new", "insert new"]):
+                logger.info(f" Forcing interactive mode for INSERT query based on user message: '{user_message}'")
+                force_interactive = True
+
+            # Check if the query has placeholders
+            has_placeholders = "?" in sql_query
+            if has_placeholders:
+                logger.info(f"🔍 INSERT query contains placeholders, will collect values interactively")
+                force_interactive = True
+
+            # If the query needs user input or we're forcing interactive mode
+            if (analysis.get("is_valid", False) and (analysis.get("needs_input", False) or force_interactive)):
+                # Get all fields from the table schema that aren't auto-increment
+                table_name = analysis.get("table_name")
+                table_schema = await self.insert_handler._get_table_schema(table_name)
+
+                # Determine which fields to collect
+                if force_interactive:
+                    # For forced interactive mode, collect all non-auto-increment fields
+                    # that aren't already provided with valid values
+                    missing_fields = []
+                    columns = analysis.get("columns", [])
+                    values = analysis.get("values", [])
+
+                    # First, add any explicitly missing fields from the analysis
+                    missing_fields.extend(analysis.get("missing_required", []))
+                    missing_fields.extend(analysis.get("missing_values", []))
+
+                    # Then, check for fields with placeholders
+                    for i, col in enumerate(columns):
+                        if i < len(values) and values[i] == "?":
+                            # Check if this field is already in missing_fields
+                            if not any(field["name"] == col for field in missing_fields):
+                                col_info = table_schema.get(col, {})
+                                # Skip auto-increment fields
+                                if not col_info.get("is_autoincrement", False):
+                                    # Check if it's a foreign key
+                                    is_foreign_key = col_info.get("is_foreign_key", False)
+                                    fk_info = col_info.get("foreign_key_info")
+
+                                    if is_foreign_key and fk_info and fk_info["referred_table"] == "department" and fk_info["referred_columns"][0] == "department_identifier":
+                                        # Special handling for department references
+                                        logger.info(f"Column {col} is a foreign key to department table, will ask for department name")
+
+                                        # Add a special field for department name
+                                        missing_fields.append({
+                                            "name": col,
+                                            "type": str(col_info.get("type", "unknown")),
+                                            "description": "Department name",
+                                            "is_foreign_key": True,
+                                            "display_name": "department_name",
+                                            "referred_table": fk_info["referred_table"],
+                                            "referred_column": fk_info["referred_columns"][0]
+                                        })
+                                    else:
+                                        # Regular field
+                                        missing_fields.append({
+                                            "name": col,
+                                            "type": str(col_info.get("type", "unknown")),
+                                            "description": f"Field for {table_name}"
+                                        })
+
+                    # If we still don't have any fields to collect, add all non-auto-increment fields
+                    if not missing_fields and table_schema:
+                        for col_name, col_info in table_schema.items():
+                            # Skip auto-increment fields
+                            if col_info.get("is_autoincrement", False):
+                                continue
+                            # Skip fields that already have valid values
+                            if col_name in columns:
+                                idx = columns.index(col_name)
+                                if idx < len(values) and values[idx] != "?" and values[idx].upper() != "NULL":
+                                    continue
+                            # Check if it's a foreign key
+                            is_foreign_key = col_info.get("is_foreign_key", False)
+                            fk_info = col_info.get("foreign_key_info")
+
+                            if is_foreign_key and fk_info and fk_info["referred_table"] == "department" and fk_info["referred_columns"][0] == "department_identifier":
+                                # Special handling for department references
+                                logger.info(f"Column {col_name} is a foreign key to department table, will ask for department name")
+
+                                # Add a special field for department name
+                                missing_fields.append({
+                                    "name": col_name,
+                                    "type": str(col_info.get("type", "unknown")),
+                                    "description": "Department name",
+                                    "is_foreign_key": True,
+                                    "display_name": "department_name",
+                                    "referred_table": fk_info["referred_table"],
+                                    "referred_column": fk_info["referred_columns"][0]
+                                })
+                            else:
+                                # Regular field
+                                missing_fields.append({
+                                    "name": col_name,
+                                    "type": str(col_info.get("type", "unknown")),
+                                    "description": f"Field for {table_name}"
+                                })
+                else:
+                    # For normal mode, use the fields identified in the analysis
+                    missing_fields = analysis.get("missing_required", []) + analysis.get("missing_values", [])
+
+                if missing_fields:
+                    logger.info(f" INSERT query needs additional values for {len(missing_fields)} fields")
+
+                    # Set up the pending query
+                    conversation.pending_insert_query = {
+                        "analysis": analysis,
+                        "remaining_fields": missing_fields[1:],  # All fields except the first
+                        "current_field": missing_fields[0],      # First field to request
+                        "collected_values": {},                  # Values collected so far
+                        "original_query": sql_query              # Original query
+                    }
+
+                    # Return a response asking for the first missing value
+                    first_field = missing_fields[0]
+
+                    # Check if this is a foreign key field with a display name
+                    field_message = ""
+                    if first_field.get("is_foreign_key") and first_field.get("display_name") == "department_name":
+                        # For department foreign keys, ask for the department name
+                        field_message = f"Please provide the department name"
+
+                        # Get available departments for the user to choose from
+                        departments = await self._get_available_departments()
+                        if departments:
+                            field_message += f". Available departments: {', '.join(departments)}"
+                    else:
+                        # Regular field
+                        field_message = f"Please provide a value for '{first_field['name']}' ({first_field['description']})"
+
+                    return {
+                        "success": True,
+                        "query_type": "INSERT_FIELD_REQUEST",
+                        "message": field_message,
+                        "field": first_field,
+                        "data": None
+                    }
+
+        # For non-INSERT queries or INSERT queries that don't need input
+        return await self.generate_sql_response(sql_query, explanation, conversation)
+
+    @staticmethod
+    def _is_read_query(sql_query: str) -> bool:
+        """Check if the SQL is a read-only SELECT (or CTE) query."""
+        return sql_query.strip().upper().startswith(("SELECT", "WITH"))
+
+    def _lookup_cached_sql(self, user_message: str, cache_key: str) -> Optional[Dict[str, Any]]:
+        """Find previously validated SQL for the same question or a close paraphrase of it."""
+        cached = self.sql_cache.get(cache_key)
+        if cached:
+            logger.info(" SQL cache hit, skipping generation")
+            return cached
+
+        if self.similarity_index is not None:
+            match = self.similarity_index.lookup(normalize_question(user_message), SIMILARITY_THRESHOLD)
+            if match:
+                similarity, similar_question, entry = match
+                self.similar_question_hits += 1
+                logger.info(f" Similar question found (similarity {similarity:.2f}), skipping generation")
+                return {**entry, "similar_question": similar_question}
+
+        return None
+
+    def _update_sql_cache(self, user_message: str, cache_key: str, sql_query: str, explanation: str,
+                          response_data: Dict[str, Any], cached: Optional[Dict[str, Any]]) -> None:
+        """
+        Remember SQL that answered a read question successfully; forget cached SQL that stopped working.
+
+        cached is what _lookup_cached_sql returned (None if the SQL was generated). When reused
+        SQL fails, both the exact entry and the similar question it came from are dropped.
+        """
+        if response_data.get("success"):
+            if cached is None and self._is_read_query(sql_query):
+                self.sql_cache.put(cache_key, sql_query, explanation)
+                if self.similarity_index is not None:
+                    self.similarity_index.add(normalize_question(user_message),
+                                              {"sql_query": sql_query, "explanation": explanation})
+        elif cached is not None:
+            self.sql_cache.invalidate(cache_key)
+            if self.similarity_index is not None:
+                self.similarity_index.remove(normalize_question(user_message))
+                if cached.get("similar_question"):
+                    self.similarity_index.remove(cached["similar_question"])
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return cache, session and generation counters."""
+        return {
+            "generation": {name: stats.summary() for name, stats in self.generation_stats.items()},
+            "sql_cache": self.sql_cache.stats(),
+            "similarity_index": {
+                **(self.similarity_index.stats() if self.similarity_index is not None else {"enabled": False}),
+                "hits": self.similar_question_hits
+            },
+            "sessions": self.conversations.stats(),
+            "admission": {**self.admission.stats(), "coalesced": self.single_flight.coalesced},
+            "llm_backend": self.llm_backend.stats(),
+            "model_routing": self.model_router.stats(),
+            "hedging": {"candidates": HEDGE_CANDIDATES, **self.hedge_stats},
+            "templates": self.template_router.stats() if self.template_router is not None else {"enabled": False},
+            "result_cache": (self.db_service.result_cache.stats() if self.db_service.result_cache is not None
+                             else {"enabled": False}),
+            "departments": self.db_service.departments.stats(),
+            "queries": self.db_service.query_guard.stats(),
+            "read_routing": self.db_service.replicas.stats(),
+            "query_shapes": self.db_service.query_shapes.stats(),
+            "db_pools": pool_stats(),
+            "cost_gate": self.cost_gate.stats() if self.cost_gate is not None else {"enabled": False}
+        }
+
+    async def generate_response(self, user_message: str, conversation: ConversationState) -> Dict[str, Any]:
         """Generate a response including SQL execution and results as JSON."""
         logger.info(" Starting SQL generation process")
 
         try:
             # Check if this is input for a pending INSERT query
-            if self.is_insert_value_input(user_message):
+            if self.is_insert_value_input(user_message, conversation):
                 logger.info("🔄 Processing input for pending INSERT query")
-                return self.process_insert_value_input(user_message)
+                return await self.process_insert_value_input(user_message, conversation)
 
             # Check if this is a follow-up question
-            if self.is_follow_up_question(user_message) and self.last_query_context:
+            if self.is_follow_up_question(user_message, conversation):
                 logger.info("🔄 Returning previous query results")
-                return self.last_query_context
-
-            # Prepare request for new query
-            prompt = f"{self.system_prompt}\n\nUser: {user_message}\n\nAssistant:"
-            request_data = {
-                "model": self.model,
-                "prompt": prompt,
-                "stream": False
-            }
+                return conversation.last_query_context
+
+            # Common question shapes are answered from a template without the model
+            template = await self.template_router.match(user_message) if self.template_router is not None else None
+            if template:
+                return await self.generate_sql_response(template["sql_query"], template["explanation"], conversation,
+                                                        template["params"], check_cost=False)
+
+            # Repeat questions skip generation and go straight to execution
+            cache_key = self.sql_cache.make_key(user_message, self.schema_fingerprint)
+            cached = self._lookup_cached_sql(user_message, cache_key)
+            if cached:
+                sql_query, explanation = cached["sql_query"], cached["explanation"]
+            else:
+                # Ask the model for SQL and extract it with the explanation
+                sql_query, explanation = await self._generate_sql(user_message, cache_key)
 
-            logger.info(f" Sending request ({len(user_message)} chars)")
-
-            # Make request to Ollama
-            response = requests.post(self.ollama_url, json=request_data)
-            response.raise_for_status()
-
-            # Parse response
-            result = response.json()
-            raw_response = result.get('response', '')
-
-            # Extract SQL and explanation
-            sql_query, explanation = self._extract_sql_and_explanation(raw_response)
-
-            # Check if this is an INSERT query that might need additional values
-            if sql_query.strip().upper().startswith("INSERT"):
-                # Analyze the INSERT query
-                analysis = self.insert_handler.analyze_insert_query(sql_query)
-
-                # Force interactive mode for certain user queries
-                force_interactive = False
-                if any(phrase in user_message.lower() for phrase in ["add new", "create new", "insert new"]):
-                    logger.info(f" Forcing interactive mode for INSERT query based on user message: '{user_message}'")
-                    force_interactive = True
-
-                # Check if the query has placeholders
-                has_placeholders = "?" in sql_query
-                if has_placeholders:
-                    logger.info(f"🔍 INSERT query contains placeholders, will collect values interactively")
-                    force_interactive = True
-
-                # If the query needs user input or we're forcing interactive mode
-                if (analysis.get("is_valid", False) and (analysis.get("needs_input", False) or force_interactive)):
-                    # Get all fields from the table schema that aren't auto-increment
-                    table_name = analysis.get("table_name")
-                    table_schema = self.insert_handler._get_table_schema(table_name)
-
-                    # Determine which fields to collect
-                    if force_interactive:
-                        # For forced interactive mode, collect all non-auto-increment fields
-                        # that aren't already provided with valid values
-                        missing_fields = []
-                        columns = analysis.get("columns", [])
-                        values = analysis.get("values", [])
-
-                        # First, add any explicitly missing fields from the analysis
-                        missing_fields.extend(analysis.get("missing_required", []))
-                        missing_fields.extend(analysis.get("missing_values", []))
-
-                        # Then, check for fields with placeholders
-                        for i, col in enumerate(columns):
-                            if i < len(values) and values[i] == "?":
-                                # Check if this field is already in missing_fields
-                                if not any(field["name"] == col for field in missing_fields):
-                                    col_info = table_schema.get(col, {})
-                                    # Skip auto-increment fields
-                                    if not col_info.get("is_autoincrement", False):
-                                        # Check if it's a foreign key
-                                        is_foreign_key = col_info.get("is_foreign_key", False)
-                                        fk_info = col_info.get("foreign_key_info")
-
-                                        if is_foreign_key and fk_info and fk_info["referred_table"] == "department" and fk_info["referred_columns"][0] == "department_identifier":
-                                            # Special handling for department references
-                                            logger.info(f"Column {col} is a foreign key to department table, will ask for department name")
-
-                                            # Add a special field for department name
-                                            missing_fields.append({
-                                                "name": col,
-                                                "type": str(col_info.get("type", "unknown")),
-                                                "description": "Department name",
-                                                "is_foreign_key": True,
-                                                "display_name": "department_name",
-                                                "referred_table": fk_info["referred_table"],
-                                                "referred_column": fk_info["referred_columns"][0]
-                                            })
-                                        else:
-                                            # Regular field
-                                            missing_fields.append({
-                                                "name": col,
-                                                "type": str(col_info.get("type", "unknown")),
-                                                "description": f"Field for {table_name}"
-                                            })
-
-                        # If we still don't have any fields to collect, add all non-auto-increment fields
-                        if not missing_fields and table_schema:
-                            for col_name, col_info in table_schema.items():
-                                # Skip auto-increment fields
-                                if col_info.get("is_autoincrement", False):
-                                    continue
-                                # Skip fields that already have valid values
-                                if col_name in columns:
-                                    idx = columns.index(col_name)
-                                    if idx < len(values) and values[idx] != "?" and values[idx].upper() != "NULL":
-                                        continue
-                                # Check if it's a foreign key
-                                is_foreign_key = col_info.get("is_foreign_key", False)
-                                fk_info = col_info.get("foreign_key_info")
-
-                                if is_foreign_key and fk_info and fk_info["referred_table"] == "department" and fk_info["referred_columns"][0] == "department_identifier":
-                                    # Special handling for department references
-                                    logger.info(f"Column {col_name} is a foreign key to department table, will ask for department name")
-
-                                    # Add a special field for department name
-                                    missing_fields.append({
-                                        "name": col_name,
-                                        "type": str(col_info.get("type", "unknown")),
-                                        "description": "Department name",
-                                        "is_foreign_key": True,
-                                        "display_name": "department_name",
-                                        "referred_table": fk_info["referred_table"],
-                                        "referred_column": fk_info["referred_columns"][0]
-                                    })
-                                else:
-                                    # Regular field
-                                    missing_fields.append({
-                                        "name": col_name,
-                                        "type": str(col_info.get("type", "unknown")),
-                                        "description": f"Field for {table_name}"
-                                    })
-                    else:
-                        # For normal mode, use the fields identified in the analysis
-                        missing_fields = analysis.get("missing_required", []) + analysis.get("missing_values", [])
-
-                    if missing_fields:
-                        logger.info(f" INSERT query needs additional values for {len(missing_fields)} fields")
-
-                        # Set up the pending query
-                        self.pending_insert_query = {
-                            "analysis": analysis,
-                            "remaining_fields": missing_fields[1:],  # All fields except the first
-                            "current_field": missing_fields[0],      # First field to request
-                            "collected_values": {},                  # Values collected so far
-                            "original_query": sql_query              # Original query
-                        }
-
-                        # Return a response asking for the first missing value
-                        first_field = missing_fields[0]
-
-                        # Check if this is a foreign key field with a display name
-                        field_message = ""
-                        if first_field.get("is_foreign_key") and first_field.get("display_name") == "department_name":
-                            # For department foreign keys, ask for the department name
-                            field_message = f"Please provide the department name"
-
-                            # Get available departments for the user to choose from
-                            departments = self._get_available_departments()
-                            if departments:
-                                field_message += f". Available departments: {', '.join(departments)}"
-                        else:
-                            # Regular field
-                            field_message = f"Please provide a value for '{first_field['name']}' ({first_field['description']})"
-
-                        return {
-                            "success": True,
-                            "query_type": "INSERT_FIELD_REQUEST",
-                            "message": field_message,
-                            "field": first_field,
-                            "data": None
-                        }
-
-            # For non-INSERT queries or INSERT queries that don't need input
-            return self.generate_sql_response(sql_query, explanation)
-
-        except requests.exceptions.RequestException as e:
+            response_data = await self._handle_generated_sql(user_message, sql_query, explanation, conversation)
+            self._update_sql_cache(user_message, cache_key, sql_query, explanation, response_data, cached)
+            return response_data
+
+        except OverloadedError as e:
+            logger.warning(f" Rejected request: {str(e)}")
+            return {
+                "success": False,
+                "status": "overloaded",
+                "error": str(e),
+                "sql_query": "",
+                "explanation": "",
+                "data": None
+            }
+        except httpx.HTTPError as e:
             logger.error(f" Error communicating: {str(e)}")
             return {
                 "success": False,
@@ -417,3 +818,160 @@ Instructions:
                 "explanation": "",
                 "data": None
             }
+
+    async def stream_response(self, user_message: str, conversation: ConversationState) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Generate a response as a stream of events.
+
+        Events are dicts with a "type" of "token" (generated text), "escalated"
+        (the small model's SQL was rejected; the tokens that follow come from
+        the large model), "sql" (sent as soon as the closing fence is seen),
+        "columns" and "rows" (result rows in chunks), then "done". Responses
+        without rows (INSERT field requests, modifications, follow-ups) are sent
+        as a single "result" event, and failures as an "error" event.
+        """
+        logger.info(" Starting streaming SQL generation process")
+
+        try:
+            # Check if this is input for a pending INSERT query
+            if self.is_insert_value_input(user_message, conversation):
+                logger.info("🔄 Processing input for pending INSERT query")
+                yield {"type": "result", **(await self.process_insert_value_input(user_message, conversation))}
+                return
+
+            # Check if this is a follow-up question
+            if self.is_follow_up_question(user_message, conversation):
+                logger.info("🔄 Returning previous query results")
+                yield {"type": "result", **conversation.last_query_context}
+                return
+
+            template = await self.template_router.match(user_message) if self.template_router is not None else None
+            cache_key = self.sql_cache.make_key(user_message, self.schema_fingerprint)
+            cached = None if template else self._lookup_cached_sql(user_message, cache_key)
+            params = None
+            if template:
+                sql_query, explanation, params = template["sql_query"], template["explanation"], template["params"]
+            elif cached:
+                sql_query, explanation = cached["sql_query"], cached["explanation"]
+            elif self.single_flight.pending(cache_key) is not None:
+                # The same question is already being generated for another request; share its result
+                logger.info(" Identical question already in flight, waiting for its SQL")
+                sql_query, explanation = await self.single_flight.join(self.single_flight.pending(cache_key))
+            else:
+                # Forward tokens until the SQL fence closes; nothing after it is used
+                tier = self.model_router.choose_tier(user_message)
+                while True:
+                    parser = SqlFenceParser()
+                    async with aclosing(self._stream_tier(user_message, tier, parser)) as tokens:
+                        async for token in tokens:
+                            yield {"type": "token", "content": token}
+
+                    sql_query, explanation = parser.finish()
+                    reason = await self._escalation_reason(tier, sql_query)
+                    if reason is None:
+                        break
+                    # Tokens sent so far are superseded by the large model's answer
+                    tier = self._escalate(reason)
+                    yield {"type": "escalated", "reason": reason}
+
+            yield {"type": "sql", "sql_query": sql_query, "explanation": explanation, "cached": cached is not None,
+                   "template": template["template"] if template else None}
+
+            # Only SELECT results are streamed as rows
+            if not self._is_read_query(sql_query):
+                response_data = await self._handle_generated_sql(user_message, sql_query, explanation, conversation)
+                self._update_sql_cache(user_message, cache_key, sql_query, explanation, response_data, cached)
+                yield {"type": "result", **response_data}
+                return
+
+            # Rows go from the server-side cursor to the client batch by batch and are never held in full;
+            # like the JSON path, one page is sent and the last row of it keys the next page
+            plan = self.result_pager.plan(sql_query, params)
+            plan_summary = None
+            if not template and self.cost_gate is not None:
+                gate = await self.cost_gate.check(plan, sql_query, params)
+                plan, plan_summary = gate["plan"], gate["summary"]
+                if gate["error"]:
+                    response_data = {"sql_query": sql_query, "explanation": explanation, "success": False,
+                                     "error": gate["error"], "data": None, "query_plan": plan_summary}
+                    self._update_sql_cache(user_message, cache_key, sql_query, explanation, response_data, cached)
+                    conversation.last_query_context = response_data
+                    yield {"type": "result", **response_data}
+                    return
+            page_size = plan["page_size"]
+            columns = []
+            row_count = 0
+            more = False
+            last_row = None
+            try:
+                async with aclosing(self.db_service.stream_query(plan["sql"], plan["params"],
+                                                                 STREAM_ROW_CHUNK_SIZE)) as batches:
+                    async for batch in batches:
+                        if "columns" in batch:
+                            columns = batch["columns"]
+                            continue
+                        rows = batch["rows"]
+                        if row_count + len(rows) > page_size:
+                            rows = rows[:page_size - row_count]
+                            more = True
+                        if not rows:
+                            continue
+                        if not row_count:
+                            yield {"type": "columns", "columns": columns}
+                        row_count += len(rows)
+                        last_row = rows[-1]
+                        yield {"type": "rows", "rows": rows}
+            except SQLAlchemyError as e:
+                logger.error(f" Database error: {str(e)}")
+                response_data = {"sql_query": sql_query, "explanation": explanation, "success": False,
+                                 "error": str(e), "data": None}
+                if not template:
+                    self._update_sql_cache(user_message, cache_key, sql_query, explanation, response_data, cached)
+                conversation.last_query_context = response_data
+                yield {"type": "result" if not row_count else "error", **response_data}
+                return
+
+            # Follow-ups get the summary; the rows themselves were already streamed to the client
+            response_data = {
+                "sql_query": sql_query,
+                "explanation": explanation,
+                "success": True,
+                "query_type": "SELECT",
+                "message": (f"Showing the first {row_count} results" if more else f"Found {row_count} results")
+                           if row_count else "No results found for this query.",
+                "data": None if row_count else {"columns": [], "rows": []}
+            }
+            if not template:
+                self._update_sql_cache(user_message, cache_key, sql_query, explanation, response_data, cached)
+            conversation.last_query_context = response_data
+            if not row_count:
+                yield {"type": "result", **response_data}
+                return
+
+            next_page_token, truncated = None, False
+            if more:
+                if plan["key"] is not None and plan["key"] in last_row:
+                    next_page_token = self.result_pager.make_token(sql_query, params, last_row[plan["key"]])
+                else:
+                    truncated = True
+
+            yield {
+                "type": "done",
+                "success": True,
+                "query_type": "SELECT",
+                "message": response_data["message"],
+                "row_count": row_count,
+                "next_page_token": next_page_token,
+                "truncated": truncated,
+                "query_plan": plan_summary
+            }
+
+        except OverloadedError as e:
+            logger.warning(f" Rejected request: {str(e)}")
+            yield {"type": "error", "success": False, "status": "overloaded", "error": str(e)}
+        except httpx.HTTPError as e:
+            logger.error(f" Error communicating: {str(e)}")
+            yield {"type": "error", "success": False, "error": f"Error communicating : {str(e)}"}
+        except Exception as e:
+            logger.error(f" Unexpected error: {str(e)}")
+            yield {"type": "error", "success": False, "error": f"Unexpected error in LLM service: {str(e)}"}
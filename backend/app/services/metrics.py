@@ -0,0 +1,35 @@
+import math
+from collections import deque
+from typing import Deque, Dict, Any
+
+class RollingStats:
+    """Count, mean and percentiles over the most recent observations of a value."""
+
+    def __init__(self, window: int = 1000):
+        self._values: Deque[float] = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def record(self, value: float) -> None:
+        """Record one observation."""
+        self._values.append(value)
+        self.count += 1
+        self.total += value
+
+    def percentile(self, pct: float) -> float:
+        """Nearest-rank percentile over the current window."""
+        if not self._values:
+            return 0.0
+        ordered = sorted(self._values)
+        rank = max(1, math.ceil(pct / 100 * len(ordered)))
+        return ordered[rank - 1]
+
+    def summary(self) -> Dict[str, Any]:
+        """Return count, lifetime mean and windowed p50/p95/max."""
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 2) if self.count else 0.0,
+            "p50": round(self.percentile(50), 2),
+            "p95": round(self.percentile(95), 2),
+            "max": round(max(self._values), 2) if self._values else 0.0
+        }
@@ -0,0 +1,90 @@
+import re
+import logging
+from typing import Dict, Optional, Any
+from .config import OLLAMA_MODEL, OLLAMA_SMALL_MODEL, OLLAMA_LARGE_MODEL, MODEL_ROUTING_THRESHOLD
+from .sql_context_manager import SchemaContextManager, estimate_tokens
+from .metrics import RollingStats
+
+logger = logging.getLogger(__name__)
+
+SMALL_TIER = "small"
+LARGE_TIER = "large"
+
+# Words that usually mean grouping/aggregation or combining several entities
+_AGGREGATION_WORDS = re.compile(r"\b(count|sum|total|average|avg|mean|max|maximum|min|minimum|most|least|top|"
+                                r"highest|lowest|rank|group|distinct|median)\b")
+_JOIN_WORDS = re.compile(r"\b(join|joined|each|per|across|compare|compared|versus|vs|along with|together with|"
+                         r"and their|with their|for every|without any|who have|that have)\b")
+
+class ModelRouter:
+    """
+    Sends simple questions to a small, fast model and the rest to the large one.
+
+    A question's complexity score is a cheap heuristic: extra schema tables it
+    mentions, join and aggregation words, and the size of the schema that will
+    be sent with it. Questions scoring below the threshold go to the small
+    tier. Routing is off (everything uses the large model) when no small model
+    is configured.
+    """
+
+    def __init__(self, schema_context: Optional[SchemaContextManager] = None, small_model: str = OLLAMA_SMALL_MODEL,
+                 large_model: str = OLLAMA_LARGE_MODEL or OLLAMA_MODEL, threshold: int = MODEL_ROUTING_THRESHOLD):
+        self.schema_context = schema_context
+        self.small_model = small_model
+        self.large_model = large_model
+        self.threshold = threshold
+        self.enabled = bool(small_model) and small_model != large_model
+
+        self.latency_ms = {SMALL_TIER: RollingStats(), LARGE_TIER: RollingStats()}
+        self.requests = {SMALL_TIER: 0, LARGE_TIER: 0}
+        self.escalations = 0
+
+        if self.enabled:
+            logger.info(f" Model routing enabled: small={self.small_model}, large={self.large_model}, "
+                        f"threshold={self.threshold}")
+
+    def model_for(self, tier: str) -> str:
+        return self.small_model if tier == SMALL_TIER else self.large_model
+
+    def complexity(self, message: str) -> int:
+        """Score how hard a question is likely to be for the model."""
+        text = message.lower()
+        score = len(_AGGREGATION_WORDS.findall(text)) + 2 * len(_JOIN_WORDS.findall(text))
+
+        if self.schema_context is not None:
+            # Every table beyond the first usually means a join
+            score += 2 * max(0, len(self.schema_context.rank_tables(message)) - 1)
+            score += estimate_tokens(self.schema_context.build_schema_context(message)) // 500
+
+        return score
+
+    def choose_tier(self, message: str) -> str:
+        """Pick the tier that should answer a question."""
+        if not self.enabled:
+            return LARGE_TIER
+        score = self.complexity(message)
+        tier = SMALL_TIER if score < self.threshold else LARGE_TIER
+        logger.info(f" Question complexity {score}, routing to {tier} model ({self.model_for(tier)})")
+        return tier
+
+    def record(self, tier: str, latency_ms: float) -> None:
+        """Record one generation on a tier."""
+        self.requests[tier] += 1
+        self.latency_ms[tier].record(latency_ms)
+
+    def record_escalation(self) -> None:
+        self.escalations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Return per-tier request counts and latency, and how often the small tier had to escalate."""
+        small_requests = self.requests[SMALL_TIER]
+        return {
+            "enabled": self.enabled,
+            "tiers": {
+                tier: {"model": self.model_for(tier), "requests": self.requests[tier],
+                       "latency_ms": self.latency_ms[tier].summary()}
+                for tier in (SMALL_TIER, LARGE_TIER)
+            },
+            "escalations": self.escalations,
+            "escalation_rate": round(self.escalations / small_requests, 4) if small_requests else 0.0
+        }
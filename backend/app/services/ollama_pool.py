@@ -0,0 +1,164 @@
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Set, Any
+from urllib.parse import urlsplit
+import httpx
+from .config import OLLAMA_URLS, OLLAMA_EJECT_AFTER_FAILURES, OLLAMA_EJECT_SECONDS, OLLAMA_HEALTH_INTERVAL
+from .metrics import RollingStats
+
+logger = logging.getLogger(__name__)
+
+class OllamaBackend:
+    """One Ollama host: its chat URL, in-flight count, health state and latency stats."""
+
+    def __init__(self, url: str):
+        self.url = url
+        parts = urlsplit(url)
+        self.health_url = f"{parts.scheme}://{parts.netloc}/api/tags"
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.latency_ms = RollingStats()
+
+    def is_available(self, now: float) -> bool:
+        return now >= self.ejected_until
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "available": self.is_available(time.monotonic()),
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "failures": self.failures,
+            "latency_ms": self.latency_ms.summary()
+        }
+
+
+class OllamaPool:
+    """
+    Routes generations across several Ollama hosts.
+
+    Each request goes to the available backend with the fewest requests in
+    flight (ties rotate). A backend that fails ``eject_after`` times in a row is
+    taken out of rotation for ``eject_seconds``; a background probe of
+    ``/api/tags`` ejects unreachable hosts early and brings recovered ones back.
+    If every backend is ejected, the one due back soonest is used anyway rather
+    than failing outright.
+    """
+
+    def __init__(self, http_client: httpx.AsyncClient, urls: List[str] = OLLAMA_URLS,
+                 eject_after: int = OLLAMA_EJECT_AFTER_FAILURES, eject_seconds: float = OLLAMA_EJECT_SECONDS,
+                 health_interval: float = OLLAMA_HEALTH_INTERVAL):
+        if not urls:
+            raise ValueError("At least one Ollama URL is required")
+        self.http_client = http_client
+        self.backends = [OllamaBackend(url) for url in urls]
+        self.eject_after = max(1, eject_after)
+        self.eject_seconds = eject_seconds
+        self.health_interval = health_interval
+        self._next = 0
+        self._health_task: Optional[asyncio.Task] = None
+        logger.info(f" Initialized OllamaPool with {len(self.backends)} backend(s): {', '.join(urls)}")
+
+    def __len__(self) -> int:
+        return len(self.backends)
+
+    def choose(self, exclude: Optional[Set[str]] = None) -> OllamaBackend:
+        """Pick the backend for the next request."""
+        now = time.monotonic()
+        candidates = [b for b in self.backends if not exclude or b.url not in exclude] or self.backends
+        available = [b for b in candidates if b.is_available(now)]
+        if not available:
+            return min(candidates, key=lambda b: b.ejected_until)
+
+        # Rotate the starting point so equally loaded backends share the traffic
+        self._next = (self._next + 1) % len(available)
+        rotated = available[self._next:] + available[:self._next]
+        return min(rotated, key=lambda b: b.in_flight)
+
+    @asynccontextmanager
+    async def lease(self, exclude: Optional[Set[str]] = None) -> AsyncIterator[OllamaBackend]:
+        """
+        Hold a backend for the duration of one request.
+
+        Any exception raised inside the block (an HTTP error, or an error the
+        model reports mid-stream) counts as a failure of the backend; closing a
+        stream early or cancelling the request counts as a success.
+        """
+        backend = self.choose(exclude)
+        backend.in_flight += 1
+        backend.requests += 1
+        start_time = time.perf_counter()
+        failed = False
+        try:
+            yield backend
+        except Exception:
+            failed = True
+            self._record_failure(backend)
+            raise
+        finally:
+            backend.in_flight -= 1
+            if not failed:
+                backend.consecutive_failures = 0
+                backend.latency_ms.record((time.perf_counter() - start_time) * 1000)
+
+    def _record_failure(self, backend: OllamaBackend) -> None:
+        backend.failures += 1
+        backend.consecutive_failures += 1
+        if backend.consecutive_failures >= self.eject_after and backend.is_available(time.monotonic()):
+            self._eject(backend, f"{backend.consecutive_failures} consecutive failures")
+
+    def _eject(self, backend: OllamaBackend, reason: str) -> None:
+        backend.ejected_until = time.monotonic() + self.eject_seconds
+        logger.warning(f" Ejecting Ollama backend {backend.url} for {self.eject_seconds:.0f}s ({reason})")
+
+    async def check(self, backend: OllamaBackend) -> Optional[str]:
+        """Check a backend is answering, without changing its state; returns the problem, or None if it is."""
+        try:
+            response = await self.http_client.get(backend.health_url, timeout=5.0)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            return str(e) or type(e).__name__
+        return None
+
+    async def probe(self, backend: OllamaBackend) -> bool:
+        """Check a backend is answering; update its ejection state accordingly."""
+        problem = await self.check(backend)
+        if problem is not None:
+            if backend.is_available(time.monotonic()):
+                self._eject(backend, f"health check failed: {problem}")
+            return False
+
+        if not backend.is_available(time.monotonic()):
+            logger.info(f" Ollama backend {backend.url} is healthy again")
+        backend.ejected_until = 0.0
+        backend.consecutive_failures = 0
+        return True
+
+    async def _health_loop(self) -> None:
+        while True:
+            await asyncio.gather(*(self.probe(backend) for backend in self.backends))
+            await asyncio.sleep(self.health_interval)
+
+    def start(self) -> None:
+        """Start background health probing (needs a running event loop)."""
+        if self._health_task is None and self.health_interval > 0:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def close(self) -> None:
+        """Stop background health probing."""
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Return per-backend load, health and latency."""
+        return [backend.stats() for backend in self.backends]
@@ -0,0 +1,110 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Set, Tuple, Any
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError, DBAPIError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+from .config import STATEMENT_TIMEOUTS_MS, QUERY_DEADLINE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+class QueryDeadlineError(SQLAlchemyError):
+    """Raised when a query is cancelled because it ran past its deadline."""
+
+
+class QueryGuard:
+    """
+    Bounds how long generated SQL may keep a PostgreSQL backend busy.
+
+    Each guarded query gets a ``statement_timeout`` for its transaction
+    (configured per query type), and its backend pid is tracked while it runs.
+    The backend is cancelled with ``pg_cancel_backend`` when the request task
+    is cancelled (the HTTP client went away) or when the query as a whole,
+    including time spent streaming rows to a slow client, runs past the
+    deadline; the cancel is sent to the server the query runs on (primary or
+    replica). Other databases run unguarded.
+    """
+
+    def __init__(self, async_engine: AsyncEngine, statement_timeouts_ms: Dict[str, int] = STATEMENT_TIMEOUTS_MS,
+                 deadline_seconds: float = QUERY_DEADLINE_SECONDS):
+        self.async_engine = async_engine
+        self.statement_timeouts_ms = statement_timeouts_ms
+        self.deadline_seconds = deadline_seconds
+        self.enabled = async_engine.dialect.name == "postgresql"
+        # Keyed by (engine, pid): pids are only unique per server
+        self.running: Dict[Tuple[AsyncEngine, int], str] = {}
+        self._cancels: Dict[Tuple[AsyncEngine, int], asyncio.Task] = {}
+        self._background: Set[asyncio.Task] = set()
+        self.cancellations = {"deadline": 0, "disconnect": 0}
+        self.statement_timeouts = 0
+
+    async def _cancel_backend(self, engine: AsyncEngine, pid: int) -> None:
+        try:
+            async with engine.connect() as connection:
+                await connection.execute(text("SELECT pg_cancel_backend(:pid)"), {"pid": pid})
+        except (SQLAlchemyError, OSError) as e:
+            # Logged, not raised: the error the query itself ended with is the one to report
+            logger.warning(f" Could not cancel query on backend {pid}: {str(e)}")
+
+    def _cancel(self, backend: Tuple[AsyncEngine, int], reason: str) -> None:
+        """Start cancelling a backend's running query (at most once per query)."""
+        if backend not in self.running or backend in self._cancels:
+            return
+        self.cancellations[reason] += 1
+        logger.warning(f" Cancelling {self.running[backend]} query on backend {backend[1]} ({reason})")
+        task = asyncio.create_task(self._cancel_backend(*backend))
+        self._cancels[backend] = task
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    @asynccontextmanager
+    async def guard(self, connection: AsyncConnection, query_type: str) -> AsyncIterator[None]:
+        """
+        Apply the statement timeout for a query type and cancel the query if it is abandoned.
+
+        Must be entered inside the transaction the query runs in.
+
+        Raises:
+            QueryDeadlineError: If the query was cancelled for running past the deadline
+        """
+        if not self.enabled:
+            yield
+            return
+
+        timeout_ms = self.statement_timeouts_ms.get(query_type, self.statement_timeouts_ms["SELECT"])
+        # One round trip: the backend pid, and a timeout that ends with the transaction
+        result = await connection.execute(text("SELECT pg_backend_pid(), set_config('statement_timeout', :timeout, true)"),
+                                          {"timeout": str(timeout_ms)})
+        backend = (connection.engine, result.scalar())
+        self.running[backend] = query_type
+        timer = asyncio.get_running_loop().call_later(self.deadline_seconds, self._cancel, backend, "deadline")
+        try:
+            yield
+        except asyncio.CancelledError:
+            self._cancel(backend, "disconnect")
+            raise
+        except DBAPIError as e:
+            if backend in self._cancels:
+                raise QueryDeadlineError(f"Query ran longer than {self.deadline_seconds:g} seconds and was cancelled") from e
+            if "statement timeout" in str(e):
+                self.statement_timeouts += 1
+            raise
+        finally:
+            timer.cancel()
+            self.running.pop(backend, None)
+            # Don't hand the connection back to the pool while a cancel aimed at it is in flight
+            cancel = self._cancels.pop(backend, None)
+            if cancel is not None:
+                await asyncio.shield(cancel)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return running query count, statement timeouts and cancellations."""
+        return {
+            "enabled": self.enabled,
+            "running": len(self.running),
+            "statement_timeout_ms": dict(self.statement_timeouts_ms),
+            "deadline_seconds": self.deadline_seconds,
+            "statement_timeouts": self.statement_timeouts,
+            "cancellations": dict(self.cancellations)
+        }
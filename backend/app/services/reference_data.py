@@ -0,0 +1,120 @@
+import time
+import asyncio
+import logging
+from typing import Callable, Dict, List, Optional, Any
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from .config import REFERENCE_REFRESH_SECONDS, REFERENCE_RETRY_SECONDS
+from .concurrency import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+class DepartmentNames:
+    """
+    Shared, versioned map of department ids to names.
+
+    The map is loaded on first use and then reused by every query that shows
+    department names. It is reloaded in the background every refresh interval
+    (to pick up changes made outside this service) and on the next use after
+    invalidate(), which DatabaseService calls when it writes to the department
+    table. After a failed load, get() doesn't try again until the retry interval
+    has passed. Each reload that changes the map gets a new version and notifies the
+    listeners. The map is replaced, never modified, so callers can hold on to
+    the dict they were given.
+    """
+
+    def __init__(self, async_engine: AsyncEngine, refresh_interval: float = REFERENCE_REFRESH_SECONDS,
+                 retry_interval: float = REFERENCE_RETRY_SECONDS):
+        self.async_engine = async_engine
+        self.refresh_interval = refresh_interval
+        self.retry_interval = retry_interval
+        self.version = 0
+        self.refreshes = 0
+        self.failures = 0
+        self._names: Optional[Dict[Any, str]] = None
+        self._loaded_at = 0.0
+        self._stale = False
+        self._failed_at: Optional[float] = None
+        self._listeners: List[Callable[[], None]] = []
+        self._flight = SingleFlight()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    def add_listener(self, listener: Callable[[], None]) -> None:
+        """Call listener whenever department names may have changed."""
+        self._listeners.append(listener)
+
+    def _notify(self) -> None:
+        for listener in self._listeners:
+            listener()
+
+    async def get(self) -> Dict[Any, str]:
+        """Return the current id -> name map, loading it first if it is missing or invalidated."""
+        backing_off = self._failed_at is not None and time.monotonic() - self._failed_at < self.retry_interval
+        if (self._names is None or self._stale) and not backing_off:
+            await self._flight.do("refresh", self.refresh)
+        return self._names or {}
+
+    async def refresh(self) -> None:
+        """Reload the map from the database; on failure the previous map is kept."""
+        self._stale = False
+        try:
+            async with self.async_engine.connect() as connection:
+                result = await connection.execute(text("SELECT department_identifier, department_name FROM department"))
+                names = {row[0]: row[1] for row in result.fetchall()}
+        except (SQLAlchemyError, OSError) as e:
+            # OSError: the driver reports an unreachable database as e.g. ConnectionRefusedError
+            logger.error(f" Error fetching departments: {str(e)}")
+            self.failures += 1
+            self._failed_at = time.monotonic()
+            return
+
+        self._failed_at = None
+        self.refreshes += 1
+        self._loaded_at = time.monotonic()
+        if names != self._names:
+            first_load = self._names is None
+            self._names = names
+            self.version += 1
+            logger.info(f" Loaded department names (version {self.version}, {len(names)} entries)")
+            if not first_load:
+                self._notify()
+
+    def invalidate(self) -> None:
+        """Mark the map stale after a write to the department table."""
+        self._stale = True
+        self._notify()
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            # One failed reload mustn't end background refresh for good
+            try:
+                await self._flight.do("refresh", self.refresh)
+            except Exception as e:
+                logger.error(f" Background refresh of department names failed: {str(e)}")
+
+    def start(self) -> None:
+        """Start background refresh (needs a running event loop)."""
+        if self._refresh_task is None and self.refresh_interval > 0:
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def close(self) -> None:
+        """Stop background refresh."""
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the map's version, size and age."""
+        return {
+            "version": self.version,
+            "entries": len(self._names or {}),
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+            "age_seconds": round(time.monotonic() - self._loaded_at, 1) if self._names is not None else None
+        }
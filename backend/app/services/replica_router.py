@@ -0,0 +1,127 @@
+import time
+import asyncio
+import logging
+from typing import Dict, List, Optional, Any
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from .config import DATABASE_REPLICA_URLS, REPLICA_MAX_LAG_SECONDS, REPLICA_CHECK_INTERVAL
+from .db_engine import get_async_engine
+
+logger = logging.getLogger(__name__)
+
+# Seconds the replica is behind the primary (0 when it has replayed everything it received)
+_LAG_QUERY = text("SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                  "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END")
+
+class ReadReplica:
+    """One read replica: its engine, measured lag and health."""
+
+    def __init__(self, engine: AsyncEngine):
+        self.name = engine.url.render_as_string(hide_password=True)
+        self.engine = engine
+        self.lag_seconds: Optional[float] = None
+        self.healthy = False
+        self.checked = False
+        self.reads = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "url": self.name,
+            "healthy": self.healthy,
+            "lag_seconds": round(self.lag_seconds, 3) if self.lag_seconds is not None else None,
+            "reads": self.reads
+        }
+
+
+class ReplicaRouter:
+    """
+    Picks the engine SELECTs run on.
+
+    Reads are spread round-robin over the replicas whose last measured lag is
+    within max_lag; lag is measured in the background every check interval,
+    and a replica that can't be reached or lags too far falls out of rotation
+    until it recovers. With no usable replica, reads go to the primary. After a
+    write through this service, reads stay on the primary for max_lag seconds
+    so a user sees their own change.
+    """
+
+    def __init__(self, primary: AsyncEngine, replica_urls: List[str] = DATABASE_REPLICA_URLS,
+                 max_lag: float = REPLICA_MAX_LAG_SECONDS, check_interval: float = REPLICA_CHECK_INTERVAL):
+        self.primary = primary
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.replicas = [ReadReplica(get_async_engine(url, role="replica")) for url in replica_urls]
+        self._next = 0
+        self._primary_until = 0.0
+        self._check_task: Optional[asyncio.Task] = None
+        self.primary_reads = 0
+        if self.replicas:
+            logger.info(f" Routing reads over {len(self.replicas)} replica(s) (max lag {self.max_lag}s)")
+
+    def read_engine(self) -> AsyncEngine:
+        """Engine for the next read."""
+        if time.monotonic() >= self._primary_until:
+            for _ in range(len(self.replicas)):
+                replica = self.replicas[self._next % len(self.replicas)]
+                self._next += 1
+                if replica.healthy:
+                    replica.reads += 1
+                    return replica.engine
+        self.primary_reads += 1
+        return self.primary
+
+    def note_write(self) -> None:
+        """Keep reads on the primary until replicas have had time to replay a write."""
+        if self.replicas:
+            self._primary_until = time.monotonic() + self.max_lag
+
+    async def check(self, replica: ReadReplica) -> None:
+        """Measure a replica's lag and take it in or out of rotation."""
+        try:
+            async with replica.engine.connect() as connection:
+                replica.lag_seconds = float((await connection.execute(_LAG_QUERY)).scalar())
+        except (SQLAlchemyError, OSError) as e:
+            # An unreachable host surfaces from the driver as a plain OSError (e.g. ConnectionRefusedError)
+            if replica.healthy or not replica.checked:
+                logger.warning(f" Replica {replica.name} is unreachable: {str(e)}")
+            replica.healthy = False
+            replica.lag_seconds = None
+            replica.checked = True
+            return
+
+        healthy = replica.lag_seconds <= self.max_lag
+        if healthy != replica.healthy:
+            logger.info(f" Replica {replica.name} {'back in' if healthy else 'out of'} rotation "
+                        f"(lag {replica.lag_seconds:.1f}s)")
+        replica.healthy = healthy
+        replica.checked = True
+
+    async def _check_loop(self) -> None:
+        while True:
+            results = await asyncio.gather(*(self.check(replica) for replica in self.replicas), return_exceptions=True)
+            # A failed check must not end the loop; that replica stays out of rotation until a check succeeds
+            for replica, result in zip(self.replicas, results):
+                if isinstance(result, Exception):
+                    logger.error(f" Lag check for replica {replica.name} failed: {str(result)}")
+                    replica.healthy = False
+            await asyncio.sleep(self.check_interval)
+
+    def start(self) -> None:
+        """Start background lag checks (needs a running event loop)."""
+        if self.replicas and self._check_task is None:
+            self._check_task = asyncio.create_task(self._check_loop())
+
+    async def close(self) -> None:
+        """Stop lag checks."""
+        if self._check_task is not None:
+            self._check_task.cancel()
+            try:
+                await self._check_task
+            except asyncio.CancelledError:
+                pass
+            self._check_task = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Return per-replica lag and read counts, and reads served by the primary."""
+        return {"primary_reads": self.primary_reads, "replicas": [replica.stats() for replica in self.replicas]}
@@ -0,0 +1,196 @@
+import re
+import sys
+import time
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Any
+from .config import RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_MAX_BYTES, RESULT_CACHE_TTL_SECONDS
+from .concurrency import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# String literals are kept verbatim; everything else is case- and whitespace-normalized
+_LITERAL = re.compile(r"('(?:[^']|'')*')")
+_WHITESPACE = re.compile(r"\s+")
+# A FROM list starting with "(" is a subquery; its own FROM is matched on the next pass
+_FROM_LIST = re.compile(r"\bfrom\s+(?!\()(.+?)(?=\bwhere\b|\bgroup\b|\border\b|\blimit\b|\boffset\b|\bhaving\b|\bunion\b|"
+                        r"\bintersect\b|\bexcept\b|\bwindow\b|\bfor\b|\b(?:inner|left|right|full|cross|natural)\b|\bjoin\b|\)|$)")
+_TABLE_IDENTIFIER = re.compile(r'[a-z_"][\w$"]*(?:\.[a-z_"][\w$"]*)?')
+_JOIN_TABLE = re.compile(r"\bjoin\s+([\w.\"]+)")
+_WRITE_TARGET = re.compile(r"^\s*(?:insert\s+into|update|delete\s+from)\s+([\w.\"]+)")
+_CTE_NAME = re.compile(r"(?:\bwith(?:\s+recursive)?|,)\s*([\w\"]+)\s+as\s*\(")
+
+def normalize_sql(sql: str) -> str:
+    """Normalize SQL text so formatting differences map to the same cache key."""
+    parts = _LITERAL.split(sql.strip().rstrip(";").strip())
+    return "".join(part if i % 2 else _WHITESPACE.sub(" ", part.lower()) for i, part in enumerate(parts)).strip()
+
+def _table_name(identifier: str) -> str:
+    """Bare lowercase table name from a possibly schema-qualified, quoted identifier."""
+    return identifier.replace('"', "").split(".")[-1].lower()
+
+def tables_read(normalized_sql: str) -> Set[str]:
+    """Tables a normalized SELECT reads from (FROM lists and JOINs, subqueries included; CTE names are left out)."""
+    unquoted = _LITERAL.sub("''", normalized_sql)
+    tables = set()
+    for from_list in _FROM_LIST.findall(unquoted):
+        for item in from_list.split(","):
+            words = item.split()
+            if words and _TABLE_IDENTIFIER.fullmatch(words[0]):
+                tables.add(_table_name(words[0]))
+    tables.update(_table_name(name) for name in _JOIN_TABLE.findall(unquoted))
+    return tables - {_table_name(name) for name in _CTE_NAME.findall(unquoted)}
+
+def table_written(sql: str) -> Optional[str]:
+    """Target table of an INSERT, UPDATE or DELETE."""
+    match = _WRITE_TARGET.match(normalize_sql(sql))
+    return _table_name(match.group(1)) if match else None
+
+def _estimate_bytes(value: Any) -> int:
+    """Rough in-memory size of a query result (rows of scalar values)."""
+    rows = value.get("results", [])
+    return 256 + sum(64 + sum(sys.getsizeof(v) for v in row.values()) for row in rows)
+
+
+class ResultCache:
+    """
+    Bounded cache of SELECT results keyed by normalized SQL and bind parameters.
+
+    Entries remember the tables their query read. A write through
+    DatabaseService invalidates every entry reading the written table, and a
+    TTL bounds staleness from writers outside this process. Entries are evicted
+    least recently used first when either the entry count or the estimated
+    byte total is exceeded. Concurrent misses for the same query share one
+    execution, and a result is not stored if one of its tables was written
+    while it was being fetched.
+    """
+
+    def __init__(self, max_entries: int = RESULT_CACHE_MAX_ENTRIES, max_bytes: int = RESULT_CACHE_MAX_BYTES,
+                 ttl_seconds: float = RESULT_CACHE_TTL_SECONDS):
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        # Tables in the database, once known; results are only cached when every table detected is one of them
+        self.known_tables: Optional[Set[str]] = None
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._by_table: Dict[str, Set[str]] = {}
+        self._table_versions: Dict[str, int] = {}
+        self._bytes = 0
+        self.single_flight = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        logger.info(f" Initialized ResultCache (max_entries={self.max_entries}, max_bytes={self.max_bytes}, "
+                    f"ttl={self.ttl_seconds}s)")
+
+    @staticmethod
+    def make_key(normalized_sql: str, params: Optional[Dict[str, Any]] = None) -> str:
+        if not params:
+            return normalized_sql
+        bound = ", ".join(f"{name}={type(value).__name__}:{value!r}" for name, value in sorted(params.items()))
+        return f"{normalized_sql} -- {bound}"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached result for a key, or None on a miss."""
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry["created_at"] > self.ttl_seconds:
+            if entry is not None:
+                self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry["value"]
+
+    async def get_or_load(self, sql: str, params: Optional[Dict[str, Any]],
+                          loader: Callable[[], Awaitable[Dict[str, Any]]],
+                          extra_tables: Optional[Callable[[Dict[str, Any]], Set[str]]] = None) -> Dict[str, Any]:
+        """
+        Return the cached result of a SELECT, or run loader (once for all concurrent callers) and cache it.
+
+        Args:
+            sql: The SELECT
+            params: Its bind parameters
+            loader: Runs the query and returns the execute_query result dict
+            extra_tables: Given the result, the tables it depends on besides those in the SQL
+
+        Returns:
+            The result dict (shared between callers, so it must not be modified).
+            Only successful results are cached.
+        """
+        normalized = normalize_sql(sql)
+        key = self.make_key(normalized, params)
+        cached = self.get(key)
+        if cached is not None:
+            self.hits += 1
+            logger.info(" Result cache hit")
+            return cached
+
+        self.misses += 1
+        return await self.single_flight.do(key, lambda: self._load(key, normalized, loader, extra_tables))
+
+    async def _load(self, key: str, normalized_sql: str, loader: Callable[[], Awaitable[Dict[str, Any]]],
+                    extra_tables: Optional[Callable[[Dict[str, Any]], Set[str]]]) -> Dict[str, Any]:
+        tables = tables_read(normalized_sql)
+        # Every version, since the extra tables are only known once the result is in
+        versions = dict(self._table_versions)
+        value = await loader()
+        if tables and extra_tables is not None:
+            tables |= extra_tables(value)
+        # A write to one of the tables while the query ran may not be reflected in the result
+        unchanged = all(self._table_versions.get(table, 0) == versions.get(table, 0) for table in tables)
+        known = self.known_tables is None or tables <= self.known_tables
+        if value.get("success") and tables and known and unchanged:
+            self._put(key, tables, value)
+        return value
+
+    def _put(self, key: str, tables: Set[str], value: Dict[str, Any]) -> None:
+        size = _estimate_bytes(value)
+        # One huge result shouldn't flush everything else
+        if size > self.max_bytes // 4:
+            return
+        if key in self._entries:
+            self._remove(key)
+
+        self._entries[key] = {"value": value, "tables": tables, "bytes": size, "created_at": time.monotonic()}
+        self._bytes += size
+        for table in tables:
+            self._by_table.setdefault(table, set()).add(key)
+
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry["bytes"]
+        for table in entry["tables"]:
+            keys = self._by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_table[table]
+
+    def invalidate_table(self, table: str) -> int:
+        """Drop every entry that read a table; returns how many were dropped."""
+        table = _table_name(table)
+        self._table_versions[table] = self._table_versions.get(table, 0) + 1
+        keys: List[str] = list(self._by_table.get(table, ()))
+        for key in keys:
+            self._remove(key)
+        if keys:
+            self.invalidations += len(keys)
+            logger.info(f" Invalidated {len(keys)} cached result(s) for table {table}")
+        return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return cache size and hit/miss counters."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.single_flight.coalesced,
+            "invalidations": self.invalidations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
@@ -0,0 +1,104 @@
+import gzip
+import json
+import logging
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple, Any
+from fastapi.encoders import jsonable_encoder
+from .config import RESPONSE_COMPRESSION_MIN_BYTES, RESPONSE_GZIP_LEVEL, RESPONSE_BROTLI_QUALITY
+
+try:
+    import orjson
+except ImportError:  # Optional: falls back to the standard library encoder
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # Optional: without it responses are only gzip-compressed
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Result layouts a client can ask for
+RECORDS = "records"    # rows as objects: [{"col": value, ...}, ...] (the default)
+COMPACT = "compact"    # column names once, rows as arrays: [[value, ...], ...]
+COLUMNAR = "columnar"  # column names once, one array of values per column
+RESULT_FORMATS = (RECORDS, COMPACT, COLUMNAR)
+
+def _default(value: Any) -> Any:
+    """Encode types orjson doesn't know the way FastAPI's jsonable_encoder does."""
+    if isinstance(value, Decimal):
+        # NaN and Infinity (valid in a PostgreSQL numeric) have no JSON form
+        if not value.is_finite():
+            return None
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    return jsonable_encoder(value)
+
+def encode_json(content: Any) -> bytes:
+    """Serialize a response body to JSON bytes (dates, datetimes and Decimals included)."""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, separators=(",", ":")).encode("utf-8")
+
+def _column_names(columns: List[Any]) -> List[str]:
+    return [column if isinstance(column, str) else column.get("name") for column in columns]
+
+def format_rows(rows: List[Dict[str, Any]], columns: List[str], result_format: str) -> Any:
+    """Lay out row dicts as compact row arrays or per-column arrays (records are returned as they are)."""
+    if result_format == COMPACT:
+        return [[row.get(column) for column in columns] for row in rows]
+    if result_format == COLUMNAR:
+        return [[row.get(column) for row in rows] for column in columns]
+    return rows
+
+def apply_result_format(content: Dict[str, Any], result_format: str,
+                        columns: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Return a response or stream event with its rows in the requested layout.
+
+    Args:
+        content: A response dict (rows under data) or a "rows" stream event
+        result_format: One of RESULT_FORMATS
+        columns: Column order for stream "rows" events, which don't carry it
+
+    Returns:
+        A new dict; the original (which may be shared with the result cache) is left as is
+    """
+    if result_format == RECORDS:
+        return content
+
+    data = content.get("data")
+    if isinstance(data, dict) and isinstance(data.get("rows"), list):
+        names = _column_names(data.get("columns") or (list(data["rows"][0]) if data["rows"] else []))
+        formatted = {**data, "columns": names, "format": result_format}
+        formatted.pop("rows")
+        formatted["values" if result_format == COLUMNAR else "rows"] = format_rows(data["rows"], names, result_format)
+        return {**content, "data": formatted}
+
+    if content.get("type") == "rows" and columns is not None:
+        key = "values" if result_format == COLUMNAR else "rows"
+        return {"type": "rows", key: format_rows(content["rows"], columns, result_format)}
+
+    return content
+
+def _accepts(accept_encoding: str, encoding: str) -> bool:
+    """Whether an Accept-Encoding header allows an encoding (q=0 refuses it)."""
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if name.strip() in (encoding, "*"):
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+def compress(body: bytes, accept_encoding: str) -> Tuple[bytes, Optional[str]]:
+    """
+    Compress a response body with the best encoding the client accepts.
+
+    Returns:
+        Tuple of (body, content encoding or None if sent uncompressed)
+    """
+    if len(body) < RESPONSE_COMPRESSION_MIN_BYTES or not accept_encoding:
+        return body, None
+    if brotli is not None and _accepts(accept_encoding, "br"):
+        return brotli.compress(body, quality=RESPONSE_BROTLI_QUALITY), "br"
+    if _accepts(accept_encoding, "gzip"):
+        return gzip.compress(body, compresslevel=RESPONSE_GZIP_LEVEL), "gzip"
+    return body, None
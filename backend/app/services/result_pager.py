@@ -0,0 +1,169 @@
+import re
+import hmac
+import json
+import time
+import base64
+import hashlib
+import logging
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple, Any
+from .config import RESULT_PAGE_SIZE, PAGE_TOKEN_SECRET, PAGE_TOKEN_TTL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# A single-table SELECT with at most a WHERE clause: the only shape that can be paged by key
+_SIMPLE_SELECT = re.compile(
+    r"^\s*SELECT\s+(?P<columns>.+?)\s+FROM\s+(?P<table>[A-Za-z_][\w]*)"
+    r"(?:\s+(?:AS\s+)?(?P<alias>(?!WHERE\b)[A-Za-z_]\w*))?"
+    r"(?:\s+WHERE\s+(?P<where>.+?))?\s*;?\s*$",
+    re.IGNORECASE | re.DOTALL
+)
+# Anything that changes row order, grouping or row count rules out keyset paging
+_NOT_KEYSET = re.compile(r"\b(ORDER\s+BY|GROUP\s+BY|HAVING|LIMIT|OFFSET|FETCH|UNION|INTERSECT|EXCEPT|JOIN|DISTINCT|"
+                         r"WINDOW|OVER|FOR\s+UPDATE|COUNT|SUM|AVG|MIN|MAX|ARRAY_AGG|STRING_AGG|JSON_AGG)\b",
+                         re.IGNORECASE)
+
+def _encode_value(value: Any) -> Any:
+    """JSON-safe form of a bind parameter or key value that keeps its type."""
+    if isinstance(value, datetime):
+        return {"$datetime": value.isoformat()}
+    if isinstance(value, date):
+        return {"$date": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"$decimal": str(value)}
+    return value
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict) and len(value) == 1:
+        (kind, raw), = value.items()
+        if kind == "$datetime":
+            return datetime.fromisoformat(raw)
+        if kind == "$date":
+            return date.fromisoformat(raw)
+        if kind == "$decimal":
+            return Decimal(raw)
+    return value
+
+
+class ResultPager:
+    """
+    Caps generated SELECTs at a page of rows and serves further pages by key.
+
+    Single-table SELECTs whose table has a one-column primary key are rewritten
+    to ``ORDER BY <pk> LIMIT page_size + 1``; when the extra row comes back,
+    the response carries a signed continuation token holding the original SQL,
+    its parameters and the last key seen, and the next page adds
+    ``<pk> > :last`` to the query. Other SELECTs (joins, aggregates, explicit
+    ordering) are wrapped in a ``LIMIT`` and only report that they were
+    truncated. Tokens are HMAC-signed so clients can't inject SQL through them.
+    """
+
+    def __init__(self, schema_tables: Dict[str, Dict[str, Any]], page_size: int = RESULT_PAGE_SIZE,
+                 secret: str = PAGE_TOKEN_SECRET, token_ttl: float = PAGE_TOKEN_TTL_SECONDS):
+        self.page_size = max(1, page_size)
+        self.token_ttl = token_ttl
+        self._secret = secret.encode("utf-8")
+        self._primary_keys = {
+            name.lower(): info["primary_key"][0]
+            for name, info in schema_tables.items() if len(info.get("primary_key", [])) == 1
+        }
+
+    def plan(self, sql_query: str, params: Optional[Dict[str, Any]] = None, after: Any = None,
+             page_size: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Build the capped SQL for a page of a SELECT.
+
+        Args:
+            sql_query: The original SELECT
+            params: Its bind parameters
+            after: Last key of the previous page (keyset pages only)
+            page_size: Rows in this page, if smaller than the configured page size
+
+        Returns:
+            Dict with the page "sql", its "params", its "page_size", and "key" (the
+            column rows are ordered by, or None if the query can only be truncated)
+        """
+        page_size = min(page_size or self.page_size, self.page_size)
+        page_params = dict(params or {})
+        page_params["_page_limit"] = page_size + 1
+
+        match = _SIMPLE_SELECT.match(sql_query)
+        key = None
+        if match and not _NOT_KEYSET.search(f"{match.group('columns')} {match.group('where') or ''}"):
+            key = self._primary_keys.get(match.group("table").lower())
+            columns = match.group("columns")
+            # The key must come back in every row so the next page can start after it
+            if key and not (columns.strip().endswith("*") or re.search(rf"\b{re.escape(key)}\b", columns)):
+                key = None
+
+        if key is None:
+            body = sql_query.strip().rstrip(";")
+            # On its own line so a trailing -- comment in the query can't swallow the closing parenthesis
+            return {"sql": f"SELECT * FROM ({body}\n) AS capped_result LIMIT :_page_limit", "params": page_params,
+                    "page_size": page_size, "key": None}
+
+        qualified_key = f"{match.group('alias') or match.group('table')}.{key}"
+        conditions = []
+        if match.group("where"):
+            conditions.append(f"({match.group('where')}\n)")
+        if after is not None:
+            conditions.append(f"{qualified_key} > :_page_after")
+            page_params["_page_after"] = after
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        alias = f" {match.group('alias')}" if match.group("alias") else ""
+        sql = (f"SELECT {match.group('columns')} FROM {match.group('table')}{alias}{where} "
+               f"ORDER BY {qualified_key} LIMIT :_page_limit")
+        return {"sql": sql, "params": page_params, "page_size": page_size, "key": key}
+
+    def finish(self, rows: List[Dict[str, Any]], plan: Dict[str, Any], sql_query: str,
+               params: Optional[Dict[str, Any]] = None) -> Tuple[List[Dict[str, Any]], Optional[str], bool]:
+        """
+        Trim a fetched page to the page size.
+
+        Returns:
+            Tuple of (rows, next_page_token or None, truncated), where truncated
+            means more rows exist but can't be fetched with a token
+        """
+        if len(rows) <= plan["page_size"]:
+            return rows, None, False
+        rows = rows[:plan["page_size"]]
+        key = plan["key"]
+        if key is None or key not in rows[-1]:
+            return rows, None, True
+        return rows, self.make_token(sql_query, params, rows[-1][key]), False
+
+    def make_token(self, sql_query: str, params: Optional[Dict[str, Any]], after: Any) -> str:
+        """Sign a continuation token for the page after the given key."""
+        state = {
+            "sql": sql_query,
+            "params": {name: _encode_value(value) for name, value in (params or {}).items()},
+            "after": _encode_value(after),
+            "exp": int(time.time() + self.token_ttl)
+        }
+        payload = base64.urlsafe_b64encode(json.dumps(state, separators=(",", ":")).encode("utf-8")).decode("ascii")
+        signature = hmac.new(self._secret, payload.encode("utf-8"), hashlib.sha256).hexdigest()
+        return f"{payload}.{signature}"
+
+    def read_token(self, token: str) -> Tuple[str, Dict[str, Any], Any]:
+        """
+        Verify a continuation token.
+
+        Returns:
+            Tuple of (sql_query, params, after)
+
+        Raises:
+            ValueError: If the token is malformed, tampered with or expired
+        """
+        payload, _, signature = token.partition(".")
+        expected = hmac.new(self._secret, payload.encode("utf-8"), hashlib.sha256).hexdigest()
+        if not signature or not hmac.compare_digest(signature, expected):
+            raise ValueError("Invalid page token")
+        try:
+            state = json.loads(base64.urlsafe_b64decode(payload.encode("ascii")))
+        except (ValueError, UnicodeDecodeError):
+            raise ValueError("Invalid page token")
+        if state["exp"] < time.time():
+            raise ValueError("Page token has expired; please run the query again")
+        params = {name: _decode_value(value) for name, value in state["params"].items()}
+        return state["sql"], params, _decode_value(state["after"])
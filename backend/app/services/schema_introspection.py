@@ -0,0 +1,67 @@
+import time
+import logging
+from typing import Dict, List, Union, Any
+from sqlalchemy import inspect
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger(__name__)
+
+class SchemaSnapshot:
+    """
+    Columns, primary keys and foreign keys of every table, read in one pass.
+
+    Uses SQLAlchemy's multi-table reflection: on PostgreSQL each of table
+    names, columns, primary keys and foreign keys is a single pg_catalog
+    query for the whole schema, so loading costs a handful of round trips
+    however many tables there are. Other databases fall back to per-table
+    reflection. Entries have the same shape as the Inspector's per-table
+    results.
+    """
+
+    def __init__(self, bind: Union[Engine, Connection]):
+        started = time.perf_counter()
+        inspector = inspect(bind)
+        self.tables: List[str] = inspector.get_table_names()
+        # Keyed by (schema, table); schema is None for the default schema
+        columns = inspector.get_multi_columns()
+        primary_keys = inspector.get_multi_pk_constraint()
+        foreign_keys = inspector.get_multi_foreign_keys()
+        self.columns: Dict[str, List[Dict[str, Any]]] = {table: columns.get((None, table), []) for table in self.tables}
+        self.primary_keys: Dict[str, List[str]] = {
+            table: list((primary_keys.get((None, table)) or {}).get("constrained_columns") or [])
+            for table in self.tables
+        }
+        self.foreign_keys: Dict[str, List[Dict[str, Any]]] = {
+            table: foreign_keys.get((None, table), []) for table in self.tables
+        }
+        self.load_ms = (time.perf_counter() - started) * 1000
+        logger.info(f" Loaded schema snapshot: {len(self.tables)} tables in {self.load_ms:.0f} ms")
+
+    def __contains__(self, table_name: str) -> bool:
+        return table_name in self.columns
+
+
+# One snapshot per database, shared by the services that need the schema
+_snapshots: Dict[str, SchemaSnapshot] = {}
+
+def _database_key(bind: Union[Engine, Connection]) -> str:
+    """The same key for a database whichever driver (sync or async) reaches it."""
+    url = bind.engine.url
+    return url.set(drivername=url.get_backend_name()).render_as_string(hide_password=True)
+
+def get_schema_snapshot(bind: Union[Engine, Connection], refresh: bool = False) -> SchemaSnapshot:
+    """
+    Shared schema snapshot for a database, loaded on first use.
+
+    Args:
+        bind: Sync engine or connection to load it with (an async connection's
+            sync connection inside run_sync works too)
+        refresh: Reload it even if one is already loaded
+
+    Returns:
+        The snapshot
+    """
+    key = _database_key(bind)
+    if refresh or key not in _snapshots:
+        _snapshots[key] = SchemaSnapshot(bind)
+    return _snapshots[key]
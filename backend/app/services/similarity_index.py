@@ -0,0 +1,237 @@
+import re
+import math
+import heapq
+import logging
+from typing import Dict, List, Optional, Tuple, Any
+import numpy as np
+from .config import SIMILARITY_MAX_ENTRIES, SIMILARITY_NGRAM_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Mersenne prime for the universal hash family used by the MinHash signatures
+_HASH_PRIME = (1 << 31) - 1
+
+# Words (and numbers: years, ids, amounts) of a question; "n't" counts as "not"
+_WORD = re.compile(r"[a-z]+|\d+(?:\.\d+)?")
+_CONTRACTED_NOT = re.compile(r"n't\b")
+# Filler that doesn't change what is asked. Negations ("not", "no", "without", "except", "non") and
+# words like "and"/"or" are deliberately absent: a question differing in one of them asks something else
+_STOPWORDS = {
+    "a", "an", "the", "of", "for", "to", "in", "on", "at", "by", "with", "from", "all", "every", "each",
+    "me", "us", "i", "we", "you", "my", "our", "please", "can", "could", "would", "will", "want", "need",
+    "show", "list", "give", "get", "display", "find", "tell", "see", "fetch", "return", "what", "which",
+    "who", "how", "is", "are", "was", "were", "be", "do", "does", "there", "that", "those", "these", "whose"
+}
+
+def content_words(question: str) -> frozenset:
+    """
+    The words of a question that carry its meaning: stopwords dropped, plurals folded.
+
+    Two questions can only share SQL if these are identical, so questions
+    that differ by a negation, an antonym ("ascending"/"descending",
+    "active"/"inactive"), a different name or any number never match, however
+    close their characters are.
+    """
+    words = set()
+    for word in _WORD.findall(_CONTRACTED_NOT.sub(" not", question.lower())):
+        if word in _STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.add(word)
+    return frozenset(words)
+
+class QuestionSimilarityIndex:
+    """
+    In-process near-duplicate lookup over previously answered questions.
+
+    Questions are represented as L2-normalized character n-gram count vectors.
+    Candidates are found with MinHash locality-sensitive hashing: each question
+    gets a numpy-computed signature that is split into bands, and questions
+    sharing a band land in the same bucket. Only the few candidates sharing the
+    most bands are scored with the exact cosine similarity, so lookup cost
+    doesn't grow with the number of indexed questions. A candidate must also
+    have the same content words (see content_words), so questions that differ
+    in a number ("hired after 2020" vs "2021"), a negation or an antonym never
+    match. Everything runs offline; no embedding service is involved.
+    """
+
+    def __init__(self, max_entries: int = SIMILARITY_MAX_ENTRIES, ngram_size: int = SIMILARITY_NGRAM_SIZE,
+                 bands: int = 16, rows_per_band: int = 4, max_bucket_candidates: int = 32, rerank_candidates: int = 8,
+                 seed: int = 7):
+        self.max_entries = max(1, max_entries)
+        self.ngram_size = ngram_size
+        self.bands = bands
+        self.rows_per_band = rows_per_band
+        self.max_bucket_candidates = max_bucket_candidates
+        self.rerank_candidates = rerank_candidates
+
+        rng = np.random.default_rng(seed)
+        num_hashes = bands * rows_per_band
+        self._hash_a = rng.integers(1, _HASH_PRIME, size=(num_hashes, 1), dtype=np.uint64)
+        self._hash_b = rng.integers(0, _HASH_PRIME, size=(num_hashes, 1), dtype=np.uint64)
+
+        self._vocabulary: Dict[str, int] = {}
+        self._buckets: Dict[bytes, List[int]] = {}
+
+        # Per-entry data, indexed by entry id (None once evicted)
+        self._vectors: List[Optional[Dict[int, float]]] = []
+        self._signatures: List[Optional[np.ndarray]] = []
+        self._payloads: List[Optional[Dict[str, Any]]] = []
+        self._words: List[Optional[frozenset]] = []
+        self._questions: List[Optional[str]] = []
+        self._by_question: Dict[str, int] = {}
+        self._live = 0
+
+    def __len__(self) -> int:
+        return self._live
+
+    def _ngrams(self, question: str) -> Dict[str, int]:
+        """Count the character n-grams of a question, padded so short words still match."""
+        padded = f" {question} "
+        n = self.ngram_size
+        counts: Dict[str, int] = {}
+        for i in range(max(1, len(padded) - n + 1)):
+            gram = padded[i:i + n]
+            counts[gram] = counts.get(gram, 0) + 1
+        return counts
+
+    def _signature(self, term_ids: List[int]) -> np.ndarray:
+        """MinHash signature of a set of n-gram ids."""
+        ids = np.asarray(term_ids, dtype=np.uint64)[np.newaxis, :]
+        return ((self._hash_a * ids + self._hash_b) % _HASH_PRIME).min(axis=1)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        r = self.rows_per_band
+        return [bytes([band]) + signature[band * r:(band + 1) * r].tobytes() for band in range(self.bands)]
+
+    def add(self, question: str, payload: Dict[str, Any]) -> None:
+        """
+        Index a normalized question with the payload (e.g. validated SQL) to return for it.
+
+        Args:
+            question: The normalized question text
+            payload: Data to return when a similar question is looked up
+        """
+        existing = self._by_question.get(question)
+        if existing is not None:
+            self._payloads[existing] = payload
+            return
+
+        if self._live >= self.max_entries:
+            self._evict_oldest()
+
+        counts = self._ngrams(question)
+        norm = math.sqrt(sum(c * c for c in counts.values())) or 1.0
+        vector: Dict[int, float] = {}
+        for gram, count in counts.items():
+            term_id = self._vocabulary.setdefault(gram, len(self._vocabulary))
+            vector[term_id] = count / norm
+
+        entry_id = len(self._vectors)
+        signature = self._signature(list(vector))
+        for key in self._band_keys(signature):
+            self._buckets.setdefault(key, []).append(entry_id)
+
+        self._vectors.append(vector)
+        self._signatures.append(signature)
+        self._payloads.append(payload)
+        self._words.append(content_words(question))
+        self._questions.append(question)
+        self._by_question[question] = entry_id
+        self._live += 1
+
+    def remove(self, question: str) -> bool:
+        """Drop a question (e.g. because its SQL stopped working); returns whether it was indexed."""
+        entry_id = self._by_question.pop(question, None)
+        if entry_id is None:
+            return False
+        self._vectors[entry_id] = None
+        self._signatures[entry_id] = None
+        self._payloads[entry_id] = None
+        self._words[entry_id] = None
+        self._questions[entry_id] = None
+        self._live -= 1
+
+        if len(self._vectors) > 2 * max(self._live, 1):
+            self._rebuild()
+        return True
+
+    def _evict_oldest(self) -> None:
+        """Tombstone the oldest live entry and compact once tombstones dominate."""
+        self.remove(next(iter(self._by_question)))
+
+    def _rebuild(self) -> None:
+        """Re-index live entries so buckets don't accumulate dead ids."""
+        live = [(question, self._vectors[entry_id], self._signatures[entry_id], self._payloads[entry_id],
+                 self._words[entry_id])
+                for question, entry_id in self._by_question.items()]
+        self._buckets = {}
+        self._vectors, self._signatures, self._payloads, self._words, self._by_question = [], [], [], [], {}
+        self._questions = []
+
+        for entry_id, (question, vector, signature, payload, words) in enumerate(live):
+            for key in self._band_keys(signature):
+                self._buckets.setdefault(key, []).append(entry_id)
+            self._vectors.append(vector)
+            self._signatures.append(signature)
+            self._payloads.append(payload)
+            self._words.append(words)
+            self._questions.append(question)
+            self._by_question[question] = entry_id
+
+    def lookup(self, question: str, threshold: float = 0.0) -> Optional[Tuple[float, str, Dict[str, Any]]]:
+        """
+        Find the most similar indexed question.
+
+        Args:
+            question: The normalized question text
+            threshold: Minimum cosine similarity to accept
+
+        Returns:
+            Tuple of (similarity, the indexed question, its payload), or None if nothing reaches the threshold
+        """
+        if not self._live:
+            return None
+
+        # Unknown n-grams add nothing to the dot product but still count towards the norm
+        counts = self._ngrams(question)
+        norm = math.sqrt(sum(c * c for c in counts.values())) or 1.0
+        query: Dict[int, float] = {}
+        for gram, count in counts.items():
+            term_id = self._vocabulary.get(gram)
+            if term_id is not None:
+                query[term_id] = count / norm
+        if not query:
+            return None
+
+        # Entries sharing the most bands are the likeliest near-duplicates; only those are scored exactly
+        band_matches: Dict[int, int] = {}
+        for key in self._band_keys(self._signature(list(query))):
+            bucket = self._buckets.get(key)
+            if bucket:
+                for entry_id in bucket[-self.max_bucket_candidates:]:
+                    band_matches[entry_id] = band_matches.get(entry_id, 0) + 1
+        candidates = heapq.nlargest(self.rerank_candidates, band_matches, key=band_matches.__getitem__)
+
+        words = content_words(question)
+        best_score, best_id = 0.0, -1
+        for entry_id in candidates:
+            vector = self._vectors[entry_id]
+            if vector is None or self._words[entry_id] != words:
+                continue
+            score = sum(weight * vector.get(term_id, 0.0) for term_id, weight in query.items())
+            if score > best_score:
+                best_score, best_id = score, entry_id
+
+        if best_id < 0 or best_score < threshold:
+            return None
+        return best_score, self._questions[best_id], self._payloads[best_id]
+
+    def stats(self) -> Dict[str, Any]:
+        """Return index size counters."""
+        return {
+            "entries": self._live,
+            "max_entries": self.max_entries,
+            "buckets": len(self._buckets)
+        }
@@ -0,0 +1,136 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Tuple, Any, Optional
+from .config import SQL_CACHE_MAX_ENTRIES, SQL_CACHE_TTL_SECONDS, SQL_CACHE_PATH, SQL_CACHE_SAVE_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# Sentence punctuation at the end of a word ("employees?" -> "employees"), but not "5.5" or "x > 3"
+_TRAILING_PUNCTUATION = re.compile(r"[?!.,;:]+(?=\s|$)")
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_question(message: str) -> str:
+    """Normalize a user question so trivially re-worded repeats map to the same key."""
+    normalized = _TRAILING_PUNCTUATION.sub("", message.strip().lower())
+    return _WHITESPACE.sub(" ", normalized).strip()
+
+def schema_fingerprint(schema: str) -> str:
+    """Short stable hash of the schema text, so cached SQL is dropped when the schema changes."""
+    return hashlib.sha256(schema.encode("utf-8")).hexdigest()[:16]
+
+
+class SqlAnswerCache:
+    """
+    LRU + TTL cache mapping normalized questions to previously generated SQL.
+
+    Keys combine the normalized question with a schema fingerprint. Entries can
+    optionally be persisted to a JSON file so the cache survives restarts.
+    """
+
+    def __init__(self, max_entries: int = SQL_CACHE_MAX_ENTRIES, ttl_seconds: float = SQL_CACHE_TTL_SECONDS,
+                 path: Optional[str] = SQL_CACHE_PATH or None):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.path = path
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._dirty = False
+        self._last_save = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+
+        if self.path:
+            self._load()
+
+        logger.info(f" Initialized SqlAnswerCache (max_entries={self.max_entries}, ttl={self.ttl_seconds}s, "
+                    f"persisted={'yes' if self.path else 'no'}, entries={len(self._entries)})")
+
+    @staticmethod
+    def make_key(message: str, fingerprint: str) -> str:
+        """Build the cache key for a question under a given schema fingerprint."""
+        return f"{fingerprint}:{normalize_question(message)}"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached entry for a key, or None on a miss."""
+        entry = self._entries.get(key)
+        if entry is None or time.time() - entry["created_at"] > self.ttl_seconds:
+            if entry is not None:
+                del self._entries[key]
+                self._dirty = True
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: str, sql_query: str, explanation: str = "") -> None:
+        """Cache the SQL generated for a key, evicting the least recently used entries if full."""
+        self._entries[key] = {
+            "sql_query": sql_query,
+            "explanation": explanation,
+            "created_at": time.time()
+        }
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+        self._dirty = True
+        if self.path and time.monotonic() - self._last_save > SQL_CACHE_SAVE_INTERVAL:
+            self.save()
+
+    def invalidate(self, key: str) -> None:
+        """Drop a single entry (e.g. when its SQL stops executing successfully)."""
+        if self._entries.pop(key, None) is not None:
+            self._dirty = True
+
+    def entries_for(self, fingerprint: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """Return (normalized question, entry) pairs cached under a schema fingerprint."""
+        prefix = f"{fingerprint}:"
+        return [(key[len(prefix):], entry) for key, entry in self._entries.items() if key.startswith(prefix)]
+
+    def _load(self) -> None:
+        """Load persisted entries, skipping expired ones."""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+            now = time.time()
+            for key, entry in entries.items():
+                if now - entry.get("created_at", 0) <= self.ttl_seconds:
+                    self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        except (OSError, ValueError) as e:
+            logger.error(f"Error loading SQL cache from {self.path}: {str(e)}")
+
+    def save(self) -> None:
+        """Write the cache to disk if persistence is enabled and anything changed."""
+        self._last_save = time.monotonic()
+        if not self.path or not self._dirty:
+            return
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f)
+            # Atomic replace so a crash never leaves a half-written cache file
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+        except OSError as e:
+            logger.error(f"Error saving SQL cache to {self.path}: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Return cache size and hit/miss counters."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
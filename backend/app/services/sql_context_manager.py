@@ -0,0 +1,125 @@
+import re
+import logging
+from typing import Dict, List, Set, Any
+from .config import SCHEMA_TOKEN_BUDGET, SCHEMA_FK_HOPS
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+def _stem(token: str) -> str:
+    """Very small plural stemmer so "employees" matches "employee" and "departments" matches "department"."""
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+def _tokens(text: str) -> Set[str]:
+    """Split text or an identifier (snake_case / camelCase) into stemmed lowercase tokens."""
+    text = re.sub(r"([a-z])([A-Z])", r"\1 \2", text)
+    return {_stem(token) for token in _WORD.findall(text.lower().replace("_", " "))}
+
+def estimate_tokens(text: str) -> int:
+    """Rough prompt token estimate (about four characters per token)."""
+    return len(text) // 4 + 1
+
+
+class SchemaContextManager:
+    """
+    Selects the part of the database schema that is relevant to a question.
+
+    Tables are ranked by how many of the question's words appear in the table
+    name (weighted higher) and its column names. The best tables are expanded
+    with their foreign key neighbours so joins stay possible, and table blocks
+    are added until the token budget is used up. Selected tables are emitted in
+    the original schema order so prompts for similar questions share a prefix.
+    """
+
+    TABLE_NAME_WEIGHT = 3
+    COLUMN_WEIGHT = 1
+
+    def __init__(self, schema_tables: Dict[str, Dict[str, Any]], token_budget: int = SCHEMA_TOKEN_BUDGET,
+                 fk_hops: int = SCHEMA_FK_HOPS):
+        self.token_budget = token_budget
+        self.fk_hops = fk_hops
+        self._order = list(schema_tables)
+        self._position = {name: i for i, name in enumerate(self._order)}
+        self._text = {name: info["text"] for name, info in schema_tables.items()}
+        self._name_tokens = {name: _tokens(name) for name in schema_tables}
+        self._column_tokens = {
+            name: set().union(*(_tokens(col) for col in info.get("columns", []))) if info.get("columns") else set()
+            for name, info in schema_tables.items()
+        }
+
+        # Foreign keys are followed in both directions
+        self._neighbours: Dict[str, Set[str]] = {name: set() for name in schema_tables}
+        for name, info in schema_tables.items():
+            for referred in info.get("referenced_tables", []):
+                if referred in self._neighbours and referred != name:
+                    self._neighbours[name].add(referred)
+                    self._neighbours[referred].add(name)
+
+        self.full_schema = "\n\n".join(self._text[name] for name in self._order)
+        logger.info(f" Initialized SchemaContextManager ({len(self._order)} tables, "
+                    f"~{estimate_tokens(self.full_schema)} tokens, budget {self.token_budget})")
+
+    def rank_tables(self, message: str) -> List[str]:
+        """
+        Rank tables by relevance to a question.
+
+        Returns:
+            Table names with a non-zero score, best first
+        """
+        words = _tokens(message)
+        scores = {}
+        for name in self._order:
+            score = (self.TABLE_NAME_WEIGHT * len(self._name_tokens[name] & words)
+                     + self.COLUMN_WEIGHT * len(self._column_tokens[name] & words))
+            if score:
+                scores[name] = score
+        return sorted(scores, key=lambda name: (-scores[name], self._position[name]))
+
+    def select_tables(self, message: str) -> List[str]:
+        """
+        Pick the tables to show the model for a question, within the token budget.
+
+        Returns:
+            Selected table names in schema order (all tables if nothing matched)
+        """
+        ranked = self.rank_tables(message)
+        if not ranked:
+            return list(self._order)
+
+        # Matched tables first, then their FK neighbours hop by hop
+        candidates = list(ranked)
+        seen = set(ranked)
+        frontier = list(ranked)
+        for _ in range(self.fk_hops):
+            next_frontier = []
+            for name in frontier:
+                for neighbour in sorted(self._neighbours[name], key=self._position.get):
+                    if neighbour not in seen:
+                        seen.add(neighbour)
+                        candidates.append(neighbour)
+                        next_frontier.append(neighbour)
+            frontier = next_frontier
+
+        selected = set()
+        used = 0
+        for name in candidates:
+            cost = estimate_tokens(self._text[name])
+            # The best match is always included, even if it alone exceeds the budget
+            if selected and used + cost > self.token_budget:
+                continue
+            selected.add(name)
+            used += cost
+
+        return [name for name in self._order if name in selected]
+
+    def build_schema_context(self, message: str) -> str:
+        """Return the schema text to put in the prompt for a question."""
+        tables = self.select_tables(message)
+        if len(tables) == len(self._order):
+            return self.full_schema
+        return "\n\n".join(self._text[name] for name in tables)
@@ -0,0 +1,195 @@
+import re
+import logging
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, List, Optional, Set, Tuple, Any
+from sqlalchemy.exc import DBAPIError
+from .config import QUERY_SHAPES_MAX
+from .metrics import RollingStats
+from .result_cache import normalize_sql
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r"""
+    (?P<string>'(?:[^']|'')*')
+  | (?P<identifier>"(?:[^"]|"")*")
+  | (?P<comment>--[^\n]*|/\*.*?\*/)
+  | (?P<cast>::)
+  | (?P<bind>:\w+)
+  | (?P<number>\d+(?:\.\d*)?(?:[eE][+-]?\d+)?)
+  | (?P<word>[A-Za-z_][\w$]*)
+  | (?P<open>\()
+  | (?P<close>\))
+""", re.VERBOSE | re.DOTALL)
+
+# Clause keywords; literals are only extracted in the value clauses, where the column they are compared
+# with or assigned to gives the parameter its type. Select lists, ORDER/GROUP BY positions and LIMITs keep theirs.
+_CLAUSES = {"select", "from", "where", "group", "order", "having", "limit", "offset", "fetch", "values", "set",
+            "on", "join", "using", "returning", "window", "union", "intersect", "except", "into"}
+_VALUE_CLAUSES = {"where", "having", "on", "set", "values"}
+# Typed literals (DATE '2024-01-01', INTERVAL '1 day') stay as written
+_TYPE_PREFIXES = {"date", "time", "timestamp", "timestamptz", "interval"}
+_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+_TIMESTAMP = re.compile(r"\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(?::\d{2}(?:\.\d{1,6})?)?")
+# A minus sign after an operator, "(", "," or keyword is the number's own (PostgreSQL can't pick a type for -$1)
+_SIGN = re.compile(r"(?:[=<>(,+*/%]|\b(?:and|or|not|between|when|then|else|where|having|set|values))\s*(-)\s*$",
+                   re.IGNORECASE)
+
+def literal_value(kind: str, literal: str) -> Any:
+    """
+    Python value for a SQL literal, typed so asyncpg can encode it for the column it meets.
+
+    Integers become int and other numbers Decimal; quoted ISO dates and
+    timestamps become date and datetime, and other strings str.
+    """
+    if kind == "number":
+        return int(literal) if literal.lstrip("-").isdigit() else Decimal(literal)
+    value = literal[1:-1].replace("''", "'")
+    try:
+        if _DATE.fullmatch(value):
+            return date.fromisoformat(value)
+        if _TIMESTAMP.fullmatch(value):
+            return datetime.fromisoformat(value)
+    except ValueError:
+        pass
+    return value
+
+def parameterize(sql: str, params: Optional[Dict[str, Any]] = None) -> Tuple[str, Dict[str, Any]]:
+    """
+    Rewrite a statement's literals into bind parameters.
+
+    String and numeric literals in WHERE, HAVING, ON, SET and VALUES clauses
+    are replaced by :lit1, :lit2, ... (names already in params are skipped).
+
+    Args:
+        sql: The statement, with any existing :name parameters
+        params: Its existing bind parameters
+
+    Returns:
+        Tuple of (template, params including the extracted literals); the
+        statement is returned unchanged when it has no literals to extract
+    """
+    bound = dict(params or {})
+    tokens = [token for token in _TOKEN.finditer(sql) if token.lastgroup != "comment"]
+    pieces: List[str] = []
+    position = 0
+    number = 0
+    clause: Optional[str] = None
+    enclosing: List[Optional[str]] = []
+
+    for i, token in enumerate(tokens):
+        kind = token.lastgroup
+        if kind == "word":
+            if token.group().lower() in _CLAUSES:
+                clause = token.group().lower()
+            continue
+        if kind == "open":
+            enclosing.append(clause)
+            continue
+        if kind == "close":
+            clause = enclosing.pop() if enclosing else clause
+            continue
+        if kind not in ("string", "number") or clause not in _VALUE_CLAUSES:
+            continue
+
+        start = token.start()
+        previous = tokens[i - 1] if i > 0 else None
+        following = tokens[i + 1] if i + 1 < len(tokens) else None
+        # E'..', U&'..', a.1 or 1abc aren't plain literals; 'x'::type and DATE 'x' carry their own type
+        if start > 0 and (sql[start - 1].isalnum() or sql[start - 1] in "_.&$"):
+            continue
+        if following is not None and following.lastgroup == "cast":
+            continue
+        if previous is not None and previous.lastgroup == "word" and previous.group().lower() in _TYPE_PREFIXES:
+            continue
+
+        literal = token.group()
+        if kind == "number":
+            sign = _SIGN.search(sql, position, start)
+            if sign is not None:
+                start = sign.start(1)
+                literal = "-" + literal
+
+        number += 1
+        while f"lit{number}" in bound:
+            number += 1
+        name = f"lit{number}"
+        bound[name] = literal_value(kind, literal)
+        pieces.append(sql[position:start])
+        pieces.append(f":{name}")
+        position = token.end()
+
+    if not pieces:
+        return sql, dict(params or {})
+    pieces.append(sql[position:])
+    return "".join(pieces), bound
+
+# Errors from a parameter's type: datatype mismatch, no or ambiguous operator/function, undeterminable
+# parameter type, impossible cast. Other errors (syntax, unknown column) fail the same way with literals.
+_PARAMETER_TYPE_SQLSTATES = {"42804", "42883", "42725", "42P18", "42846"}
+
+def needs_literals(error: DBAPIError) -> bool:
+    """
+    Whether a statement that failed with its literals bound might run with them inline.
+
+    Bound parameters take the type of what they are compared with, where a
+    literal is coerced: asyncpg refuses values of another type ("invalid input
+    for query argument"), and the server may fail to resolve an operator or
+    function for a parameter's type that it resolves for a literal.
+    """
+    sqlstate = getattr(error.orig, "sqlstate", None) or ""
+    return "invalid input for query argument" in str(error) or sqlstate in _PARAMETER_TYPE_SQLSTATES
+
+
+class QueryShapes:
+    """
+    Executions and latency per statement template (normalized), most recently used first.
+
+    Also remembers the templates that failed with their literals bound as
+    parameters but ran with them inline, so those run inline from then on.
+    """
+
+    def __init__(self, max_shapes: int = QUERY_SHAPES_MAX):
+        self.max_shapes = max(1, max_shapes)
+        self._shapes: "OrderedDict[str, RollingStats]" = OrderedDict()
+        self._inline: Set[str] = set()
+        self.parameterized = 0
+        self.inline_fallbacks = 0
+
+    def record(self, template: str, elapsed_ms: float, parameterized: bool = False) -> None:
+        """Record one successful execution of a template (and whether it ran with bound parameters)."""
+        if parameterized:
+            self.parameterized += 1
+        key = normalize_sql(template)
+        shape = self._shapes.get(key)
+        if shape is None:
+            shape = RollingStats(window=200)
+            self._shapes[key] = shape
+            while len(self._shapes) > self.max_shapes:
+                self._shapes.popitem(last=False)
+        else:
+            self._shapes.move_to_end(key)
+        shape.record(elapsed_ms)
+
+    def runs_inline(self, template: str) -> bool:
+        """Whether a template has to run with its literals inline."""
+        return normalize_sql(template) in self._inline
+
+    def mark_inline(self, template: str) -> None:
+        """Run a template with its literals inline from now on."""
+        self.inline_fallbacks += 1
+        if len(self._inline) < self.max_shapes:
+            self._inline.add(normalize_sql(template))
+        logger.info(f" Statement needs its literals inline: {normalize_sql(template)[:200]}")
+
+    def stats(self, top: int = 20) -> Dict[str, Any]:
+        """Return the most frequently run templates with their latency, and fallback counts."""
+        busiest = sorted(self._shapes.items(), key=lambda item: item[1].count, reverse=True)[:top]
+        return {
+            "tracked": len(self._shapes),
+            "parameterized": self.parameterized,
+            "inline_fallbacks": self.inline_fallbacks,
+            "inline_templates": len(self._inline),
+            "top": [{"template": key, "latency_ms": latency.summary()} for key, latency in busiest]
+        }
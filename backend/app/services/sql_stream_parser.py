@@ -0,0 +1,77 @@
+from typing import List, Tuple
+
+FENCE = "```"
+
+class SqlFenceParser:
+    """
+    Incremental parser for model output containing a fenced SQL block.
+
+    Text can be fed token by token as it streams in. Lines inside the first
+    ``` fenced block are collected as SQL and every other line as explanation.
+    As soon as the closing fence is seen the parser reports completion, so the
+    caller can stop the generation instead of decoding tokens it won't use.
+    """
+
+    def __init__(self):
+        self._partial_line = ""
+        self._sql_lines: List[str] = []
+        self._explanation_lines: List[str] = []
+        self._in_code_block = False
+        self.complete = False
+
+    def feed(self, text: str) -> bool:
+        """
+        Feed the next chunk of generated text.
+
+        Args:
+            text: Newly generated text (any length, may split lines)
+
+        Returns:
+            True once the closing fence of the SQL block has been seen
+        """
+        if self.complete or not text:
+            return self.complete
+
+        lines = (self._partial_line + text).split("\n")
+        self._partial_line = lines.pop()
+
+        for line in lines:
+            self._process_line(line)
+            if self.complete:
+                self._partial_line = ""
+                return True
+
+        # The closing fence is often the last thing generated, with no newline after it
+        if self._in_code_block and FENCE in self._partial_line:
+            self._process_line(self._partial_line)
+            self._partial_line = ""
+
+        return self.complete
+
+    def _process_line(self, line: str) -> None:
+        if FENCE in line:
+            if self._in_code_block:
+                self.complete = True
+            self._in_code_block = not self._in_code_block
+            return
+
+        if self._in_code_block:
+            self._sql_lines.append(line)
+        else:
+            self._explanation_lines.append(line)
+
+    def finish(self) -> Tuple[str, str]:
+        """
+        Flush any buffered text and return the parsed output.
+
+        An unterminated block (e.g. generation cut off by the token limit) is
+        treated as complete.
+
+        Returns:
+            Tuple of (sql_query, explanation)
+        """
+        if self._partial_line:
+            self._process_line(self._partial_line)
+            self._partial_line = ""
+
+        return "\n".join(self._sql_lines).strip(), "\n".join(self._explanation_lines).strip()
@@ -0,0 +1,186 @@
+import re
+import logging
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional, Tuple, Any
+from .insert_handler import InsertQueryHandler
+from .sql_cache import normalize_question
+
+logger = logging.getLogger(__name__)
+
+_DEPARTMENT_SLOT = r"(?:in|from|of|working in|within)(?: the)? (?P<department>.+?)(?: department| dept| team)?"
+_EMPLOYEES = r"(?:all )?(?:the )?(?:employees|staff|workers)"
+_LIST_VERB = r"(?:(?:list|show|get|display|find|give)(?: me)? )?"
+
+# Each template: the question shape, the schema it needs, and the SQL it produces.
+# SQL uses bind parameters only; slot values never end up in the SQL text.
+_TEMPLATES = [
+    {
+        "name": "count_employees_in_department",
+        "pattern": re.compile(rf"^(?:how many|count|number of) {_EMPLOYEES} (?:are |work |are there )?{_DEPARTMENT_SLOT}$"),
+        "requires": {"employee": ["department_identifier"], "department": ["department_identifier"]},
+        "sql": "SELECT COUNT(*) AS employee_count FROM employee WHERE department_identifier = :department_id;",
+        "explanation": "Counts the employees in the {department} department."
+    },
+    {
+        "name": "count_employees",
+        "pattern": re.compile(rf"^(?:how many|count|total number of|number of) {_EMPLOYEES}(?: are there| do we have| in total)?$"),
+        "requires": {"employee": []},
+        "sql": "SELECT COUNT(*) AS employee_count FROM employee;",
+        "explanation": "Counts all employees."
+    },
+    {
+        "name": "list_employees_in_department",
+        "pattern": re.compile(rf"^{_LIST_VERB}{_EMPLOYEES} (?:who work |working |that work )?{_DEPARTMENT_SLOT}$"),
+        "requires": {"employee": ["department_identifier"], "department": ["department_identifier"]},
+        "sql": "SELECT * FROM employee WHERE department_identifier = :department_id;",
+        "explanation": "Lists the employees in the {department} department."
+    },
+    {
+        "name": "list_employees_by_hire_date",
+        "pattern": re.compile(rf"^{_LIST_VERB}{_EMPLOYEES} (?:who were |that were |who got )?(?:hired|joined|employed) "
+                              r"(?P<op>after|since|before|on|in|during) (?P<date>.+)$"),
+        "requires": {"employee": ["employee_hire_date"]},
+        "sql": None,  # Built from the date operator, see _hire_date_sql
+        "explanation": "Lists the employees hired {op} {date}."
+    },
+    {
+        "name": "list_employees",
+        "pattern": re.compile(rf"^{_LIST_VERB}{_EMPLOYEES}$"),
+        "requires": {"employee": []},
+        "sql": "SELECT * FROM employee;",
+        "explanation": "Lists all employees."
+    },
+    {
+        "name": "list_departments",
+        "pattern": re.compile(rf"^{_LIST_VERB}(?:all )?(?:the )?departments$"),
+        "requires": {"department": []},
+        "sql": "SELECT * FROM department;",
+        "explanation": "Lists all departments."
+    }
+]
+
+# No NN/NN/YYYY forms: day-first and month-first read the same text differently (the INSERT handler
+# reads month-first), so those questions go to the model instead
+_DATE_FORMATS = ["%Y-%m-%d", "%Y/%m/%d", "%B %d %Y", "%b %d %Y", "%d %B %Y", "%d %b %Y"]
+_MONTH_FORMATS = ["%B %Y", "%b %Y", "%Y-%m"]
+
+def _next_month(day: date) -> date:
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+def parse_date_range(text: str) -> Optional[Tuple[date, date]]:
+    """
+    Parse a date, month or year into the half-open range [start, end) it covers.
+
+    Returns:
+        Tuple of (start, end), or None if the text isn't a recognised date
+    """
+    text = text.strip().replace(",", "")
+    if re.fullmatch(r"(19|20)\d\d", text):
+        year = int(text)
+        return date(year, 1, 1), date(year + 1, 1, 1)
+    for fmt in _DATE_FORMATS:
+        try:
+            day = datetime.strptime(text, fmt).date()
+            return day, day + timedelta(days=1)
+        except ValueError:
+            continue
+    for fmt in _MONTH_FORMATS:
+        try:
+            month = datetime.strptime(text, fmt).date()
+            return month, _next_month(month)
+        except ValueError:
+            continue
+    return None
+
+def _hire_date_sql(op: str, start: date, end: date) -> Tuple[str, Dict[str, Any]]:
+    """SQL and parameters for a hire date condition ("after 2020" means from 2021-01-01 on)."""
+    if op == "after":
+        return "SELECT * FROM employee WHERE employee_hire_date >= :start_date;", {"start_date": end}
+    if op == "since":
+        return "SELECT * FROM employee WHERE employee_hire_date >= :start_date;", {"start_date": start}
+    if op == "before":
+        return "SELECT * FROM employee WHERE employee_hire_date < :end_date;", {"end_date": start}
+    return ("SELECT * FROM employee WHERE employee_hire_date >= :start_date AND employee_hire_date < :end_date;",
+            {"start_date": start, "end_date": end})
+
+
+class TemplateRouter:
+    """
+    Answers common question shapes with prepared SQL, without calling the model.
+
+    Questions are normalized and matched against regex templates. Department
+    names are resolved to ids through the reference data the INSERT handler
+    already caches, so an unknown department simply doesn't match and the
+    question falls through to the model. Templates whose tables or columns are
+    missing from the schema are disabled.
+    """
+
+    def __init__(self, schema_tables: Dict[str, Dict[str, Any]], insert_handler: InsertQueryHandler):
+        self.insert_handler = insert_handler
+        self.templates = [t for t in _TEMPLATES if self._supported(t, schema_tables)]
+        self.matches: Dict[str, int] = {t["name"]: 0 for t in self.templates}
+        logger.info(f" Initialized TemplateRouter with {len(self.templates)} of {len(_TEMPLATES)} templates")
+
+    @staticmethod
+    def _supported(template: Dict[str, Any], schema_tables: Dict[str, Dict[str, Any]]) -> bool:
+        for table, columns in template["requires"].items():
+            if table not in schema_tables:
+                return False
+            if any(column not in schema_tables[table].get("columns", []) for column in columns):
+                return False
+        return True
+
+    async def _department_id(self, name: str) -> Optional[Any]:
+        """Resolve a department name mentioned in a question to its id (exact, case-insensitive)."""
+        ref_data = await self.insert_handler.get_reference_data("employee", "department_identifier")
+        if ref_data is None:
+            return None
+        name = re.sub(r"^the ", "", name.strip())
+        return ref_data["display_to_id"].get(name)
+
+    async def match(self, message: str) -> Optional[Dict[str, Any]]:
+        """
+        Match a question against the templates.
+
+        Args:
+            message: The user's question
+
+        Returns:
+            Dict with template, sql_query, params and explanation, or None if no template applies
+        """
+        question = normalize_question(message)
+        for template in self.templates:
+            found = template["pattern"].match(question)
+            if not found:
+                continue
+            slots = found.groupdict()
+            params: Dict[str, Any] = {}
+
+            if "department" in slots:
+                department_id = await self._department_id(slots["department"])
+                if department_id is None:
+                    continue
+                params["department_id"] = department_id
+
+            sql_query = template["sql"]
+            if "date" in slots:
+                date_range = parse_date_range(slots["date"])
+                if date_range is None:
+                    continue
+                sql_query, date_params = _hire_date_sql(slots["op"], *date_range)
+                params.update(date_params)
+
+            self.matches[template["name"]] += 1
+            logger.info(f" Question matched template '{template['name']}', skipping generation")
+            return {
+                "template": template["name"],
+                "sql_query": sql_query,
+                "params": params,
+                "explanation": template["explanation"].format(**slots)
+            }
+
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        """Return how often each template answered a question."""
+        return {"templates": len(self.templates), "matches": dict(self.matches)}
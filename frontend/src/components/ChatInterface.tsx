@@ -25,6 +25,8 @@ const ChatInterface: React.FC = () => {
   const [isThinking, setIsThinking] = useState(false);
   const messagesEndRef = useRef<HTMLDivElement>(null);
   const inputRef = useRef<HTMLTextAreaElement>(null);
+  // Session id issued by the backend so conversation state stays per-client
+  const sessionIdRef = useRef<string | null>(null);
 
   const scrollToBottom = useCallback(() => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
@@ -49,10 +51,14 @@ const ChatInterface: React.FC = () => {
     try {
       const response = await axios.post('http://localhost:8000/api/chat', {
         message: inputText,
+        session_id: sessionIdRef.current,
       });
 
       // The response now contains structured data
       const responseData = response.data;
+      if (responseData.session_id) {
+        sessionIdRef.current = responseData.session_id;
+      }
 
       // Create a formatted message for display
       let displayText = '';